@@ -0,0 +1,203 @@
+from __future__ import division
+
+import threading
+from collections import OrderedDict
+from decimal import localcontext
+from math import ceil, log10
+
+import numpy as np
+
+from backends import DECIMAL_DIGITS, period_eps, pixel_grid, to_decimal
+from perturbation import BAILOUT, precision_digits, reference_orbit
+
+BASE_ITERS = 256
+DECADE_ITERS = 128
+MAX_ITERS = 2**16
+PROBE_SIZE = 96
+CHUNKS = 4
+ESCAPE_THRESHOLD = 1e-3
+REMEMBERED_BUDGETS = 256
+PERIOD_FLOOR = 1e-14
+
+
+def initial_iterations(min_x,max_x,min_y,max_y):
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        span = float(max(abs(to_decimal(max_x) - to_decimal(min_x)),
+                         abs(to_decimal(max_y) - to_decimal(min_y))))
+    return int(BASE_ITERS + DECADE_ITERS*max(0.0,log10(4.0/span)))
+
+
+def escape_histogram(M,iters,chunks=CHUNKS):
+    chunk = max(iters//chunks,1)
+    escaped = M[M > 0]
+    index = np.minimum((escaped//chunk).astype(np.intp),chunks - 1)
+    return np.bincount(index,minlength=chunks)
+
+
+# The probe follows every lattice point as a float64 delta from one
+# reference orbit (see perturbation.py), so raising the budget continues the
+# surviving orbits where the last chunk stopped, at any zoom depth. count
+# holds the escape iteration, -1 once the cardioid/bulb test or periodicity
+# proves a point bounded and 0 while it is unresolved. Periodicity checks follow Brent's schedule
+# of the kernels: z is saved after iteration n whenever n + 2 is a power
+# of two.
+
+def advance_probe(orbit,d,dc,m,count,old,start,stop,eps):
+    last = orbit.shape[0] - 1
+    index = np.flatnonzero(count == 0)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for n in range(start,stop):
+            if not index.size:
+                break
+            mk, dk = m[index], d[index]
+            dk = 2*orbit[mk]*dk + dk*dk + dc[index]
+            mk += 1
+            z = orbit[mk] + dk
+            escaped = z.real*z.real + z.imag*z.imag >= BAILOUT
+            periodic = ((np.abs(z.real - old[index].real) < eps)
+                        & (np.abs(z.imag - old[index].imag) < eps) & ~escaped)
+            count[index[escaped]] = n + 1
+            count[index[periodic]] = -1
+            if (n + 2) & (n + 1) == 0:
+                old[index] = z
+            w = z - orbit[0]
+            rebase = (mk == last) | (w.real*w.real + w.imag*w.imag
+                                     < dk.real*dk.real + dk.imag*dk.imag)
+            d[index] = np.where(rebase,w,dk)
+            m[index] = np.where(rebase,0,mk)
+            index = index[~(escaped | periodic)]
+
+
+_kernel = None
+
+def _build_kernel():
+    from numba import njit, prange
+
+    @njit(parallel=True, nogil=True)
+    def advance(orbit,d,dc,m,count,old,start,stop,eps):
+        last = orbit.shape[0] - 1
+        for k in prange(d.shape[0]):
+            if count[k] != 0:
+                continue
+            dk, mk, ok = d[k], m[k], old[k]
+            for n in range(start,stop):
+                dk = 2*orbit[mk]*dk + dk*dk + dc[k]
+                mk += 1
+                z = orbit[mk] + dk
+                if z.real*z.real + z.imag*z.imag >= BAILOUT:
+                    count[k] = n + 1
+                    break
+                if abs(z.real - ok.real) < eps and abs(z.imag - ok.imag) < eps:
+                    count[k] = -1
+                    break
+                if (n + 2) & (n + 1) == 0:
+                    ok = z
+                w = z - orbit[0]
+                if mk == last or (w.real*w.real + w.imag*w.imag <
+                                  dk.real*dk.real + dk.imag*dk.imag):
+                    dk = w
+                    mk = 0
+            d[k], m[k], old[k] = dk, mk, ok
+
+    return advance
+
+
+def get_kernel(backend):
+    global _kernel
+    if backend == 'numpy':
+        return advance_probe
+    if _kernel is None:
+        try:
+            _kernel = _build_kernel()
+        except ImportError:
+            return advance_probe
+    return _kernel
+
+
+_budgets = OrderedDict()
+_budgets_lock = threading.Lock()
+
+def budget_key(min_x,max_x,min_y,max_y,width,height,real_c,imag_c,threshold,
+               max_iters):
+    bounds = tuple(str(to_decimal(value)) for value in (min_x,max_x,min_y,max_y))
+    if real_c is not None and imag_c is not None:
+        bounds += (repr(float(real_c)),repr(float(imag_c)))
+    return bounds + (int(width),int(height),float(threshold),int(max_iters))
+
+
+def adaptive_iterations(min_x,max_x,min_y,max_y,width,height,real_c=None,
+                        imag_c=None,backend='cpu',threshold=ESCAPE_THRESHOLD,
+                        max_iters=MAX_ITERS,stats=None):
+    # Budgets are remembered per view, so a revisit whose tiles are all
+    # cached does not pay for the probe again.
+    key = budget_key(min_x,max_x,min_y,max_y,width,height,real_c,imag_c,
+                     threshold,max_iters)
+    with _budgets_lock:
+        if key in _budgets:
+            iters, probe = _budgets.pop(key)
+            _budgets[key] = (iters, probe)
+            if stats is not None:
+                stats.update(probe)
+            return iters
+
+    julia = real_c is not None and imag_c is not None
+    grid_min_x, grid_min_y, pixel_size_x, pixel_size_y = pixel_grid(
+        min_x,max_x,min_y,max_y,width,height)
+    stride = max(1,int(ceil(max(width,height)/PROBE_SIZE)))
+    columns, rows = len(range(0,width,stride)), len(range(0,height,stride))
+    digits = precision_digits(min(abs(pixel_size_x),abs(pixel_size_y)))
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        center_real = (to_decimal(min_x) + to_decimal(max_x))/2
+        center_imag = (to_decimal(min_y) + to_decimal(max_y))/2
+        offset_x = float(grid_min_x - center_real)
+        offset_y = float(grid_min_y - center_imag)
+    offsets = ((offset_x + stride*pixel_size_x*np.arange(columns))[None,:]
+               + 1j*(offset_y + stride*pixel_size_y*np.arange(rows))[:,None]).ravel()
+    d = offsets.copy() if julia else np.zeros(offsets.size, dtype=np.complex128)
+    dc = np.zeros(offsets.size, dtype=np.complex128) if julia else offsets
+    m = np.zeros(offsets.size, dtype=np.int64)
+    count = np.zeros(offsets.size, dtype=np.int64)
+    if not julia:
+        # Cardioid and period-2 bulb, with the margin of the double-double
+        # kernels since c is only known to float64 here.
+        c = complex(float(center_real),float(center_imag)) + offsets
+        q = (c.real - 0.25)**2 + c.imag**2
+        count[(q*(q + (c.real - 0.25)) < 0.25*c.imag**2 - 1e-12)
+              | ((c.real + 1.0)**2 + c.imag**2 < 0.0625 - 1e-12)] = -1
+    old = d.copy()
+    eps = period_eps(stride*pixel_size_x,stride*pixel_size_y)
+    if eps < PERIOD_FLOOR:
+        # z is only held in float64: deeper than this, an orbit that shadows
+        # a cycle before escaping rounds to the same doubles and would be
+        # taken as periodic.
+        eps = -1.0
+    advance = get_kernel(backend)
+
+    done = 0
+    iters = min(initial_iterations(min_x,max_x,min_y,max_y),max_iters)
+    while True:
+        # Only the single reference orbit restarts; it is a prefix of the
+        # longer one, so the probe's orbit indices stay valid.
+        orbit = reference_orbit(center_real,center_imag,iters,digits,real_c,imag_c)
+        advance(orbit,d,dc,m,count,old,done,iters,eps)
+        done = iters
+        counts = escape_histogram(count,iters)
+        # Stop once the last chunk of the budget barely lets anything escape,
+        # but keep going while nothing has escaped at all, unless every
+        # probe point has already escaped or been proven bounded.
+        if (iters >= max_iters or not (count == 0).any()
+                or (counts.sum() and counts[-1] < threshold*count.size)):
+            break
+        iters = min(2*iters,max_iters)
+    probe = {'iterations': iters,
+             'escape_histogram': counts.tolist(),
+             'probe_pixels': int(count.size)}
+    with _budgets_lock:
+        _budgets[key] = (iters, probe)
+        while len(_budgets) > REMEMBERED_BUDGETS:
+            _budgets.popitem(last=False)
+    if stats is not None:
+        stats.update(probe)
+    return iters
@@ -0,0 +1,106 @@
+from __future__ import division
+
+import numpy as np
+
+from backends import get_backend, pixel_grid, select_precision
+from coloring import apply_colormap, shade
+from progressive import lattice_field
+
+SAMPLES = 4
+EDGE_FRACTION = 1/128
+DISTANCE_STRIDE = 4
+
+
+def edge_mask(M,threshold=None):
+    if threshold is None:
+        threshold = EDGE_FRACTION*(float(M.max()) - float(M.min()))
+    inside = M == 0
+    mask = np.zeros(M.shape, dtype=np.bool_)
+    for axis in (0,1):
+        step = (np.abs(np.diff(M,axis=axis)) > threshold) | (np.diff(inside,axis=axis) != 0)
+        if axis == 0:
+            mask[1:] |= step
+            mask[:-1] |= step
+        else:
+            mask[:,1:] |= step
+            mask[:,:-1] |= step
+    return mask
+
+
+def far_from_boundary(D,pixel_size,radius=1.0):
+    return D > radius*pixel_size
+
+
+def boundary_mask(grid,width,height,iters,real_c=None,imag_c=None,
+                  backend='cpu',precision='float32',stride=DISTANCE_STRIDE):
+    # False where the distance estimate proves a pixel holds no boundary.
+    # The estimate is on a coarse lattice, one sample per stride x stride
+    # block; the true distance is at least half the estimate, and a sample
+    # speaks for pixels up to stride*sqrt(2) pixels away.
+    min_x, min_y, pixel_size_x, pixel_size_y = grid
+    columns, rows = len(range(0,width,stride)), len(range(0,height,stride))
+    D = get_backend(backend).distance(min_x,min_y,stride*pixel_size_x,
+                                      stride*pixel_size_y,0,0,columns,rows,
+                                      iters,real_c,imag_c,precision)
+    near = ~far_from_boundary(D,max(abs(pixel_size_x),abs(pixel_size_y)),
+                              2*(1.5*stride + 1))
+    return np.repeat(np.repeat(near,stride,axis=0),stride,axis=1)[:height,:width]
+
+
+def jittered_offsets(count,samples=SAMPLES,seed=0):
+    # Stratified jitter: one random point in each cell of a samples x samples
+    # grid over the pixel footprint, drawn independently for every pixel.
+    random = np.random.RandomState(seed)
+    cells = (np.arange(samples*samples) % samples, np.arange(samples*samples)//samples)
+    jitter = random.random_sample((count,samples*samples,2))
+    return ((cells[0] + jitter[...,0])/samples - 0.5,
+            (cells[1] + jitter[...,1])/samples - 0.5)
+
+
+def edge_samples(grid,mask,iters,real_c=None,imag_c=None,backend='cpu',
+                 precision='float32',samples=SAMPLES,seed=0):
+    min_x, min_y, pixel_size_x, pixel_size_y = grid
+    ys, xs = np.nonzero(mask)
+    if not len(xs):
+        return np.zeros((0,samples*samples), dtype=np.float32)
+    dx, dy = jittered_offsets(len(xs),samples,seed)
+    values = get_backend(backend).samples(min_x,min_y,pixel_size_x,pixel_size_y,
+                                          (xs[:,None] + dx).ravel(),
+                                          (ys[:,None] + dy).ravel(),iters,
+                                          real_c,imag_c,precision)
+    return values.reshape((len(xs),samples*samples))
+
+
+def adaptive_image(min_x,max_x,min_y,max_y,width,height,iters,real_c=None,
+                   imag_c=None,fancy=True,cmap='gnuplot2',backend=None,
+                   precision='auto',samples=SAMPLES,threshold=None,stats=None):
+    if precision == 'auto':
+        precision = select_precision(min_x,max_x,min_y,max_y,width,height)
+    grid = pixel_grid(min_x,max_x,min_y,max_y,width,height)
+    M = lattice_field(grid[0],grid[1],grid[2],grid[3],width,height,iters,
+                      real_c,imag_c,backend,precision,stats)
+    cmap = str(cmap).strip()
+    if precision == 'perturbation':
+        mask = np.zeros(M.shape, dtype=np.bool_)
+    else:
+        mask = edge_mask(M,threshold)
+        edges = int(mask.sum())
+        mask &= boundary_mask(grid,width,height,iters,real_c,imag_c,backend,
+                              precision)
+    values = edge_samples(grid,mask,iters,real_c,imag_c,backend,precision,samples)
+    if stats is not None:
+        stats['precision'] = precision
+        stats['supersampled_pixels'] = int(mask.sum())
+        if precision != 'perturbation':
+            stats['distance_skipped_pixels'] = edges - int(mask.sum())
+        stats['samples'] = int(M.size + values.size)
+    vmin, vmax = float(M.min()), float(M.max())
+    if fancy == 0:
+        # Lighting needs neighbouring heights, so shade the box-filtered field.
+        M = M.copy()
+        M[mask] = values.mean(axis=1)
+        return shade(M,cmap,vert_exag=1.25,gamma=0.3,vmin=vmin,vmax=vmax)
+    rgba = apply_colormap(M,cmap,vmin,vmax)
+    colours = apply_colormap(values,cmap,vmin,vmax).astype(np.float32)
+    rgba[mask] = (colours.mean(axis=1) + 0.5).astype(np.uint8)
+    return rgba
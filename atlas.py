@@ -0,0 +1,43 @@
+from __future__ import division
+
+import numpy as np
+
+from backends import get_backend, pixel_grid
+
+JULIA_BOUNDS = (-1.8,1.8,-1.8,1.8)
+C_BOUNDS = (-2.0,0.6,-1.3,1.3)
+
+
+def atlas_c_values(rows,columns,c_bounds=C_BOUNDS):
+    # Tile centres over the c plane, row 0 at min imag like every other field.
+    min_x, max_x, min_y, max_y = c_bounds
+    real = min_x + (np.arange(columns) + 0.5)*(max_x - min_x)/columns
+    imag = min_y + (np.arange(rows) + 0.5)*(max_y - min_y)/rows
+    return np.tile(real,rows), np.repeat(imag,columns)
+
+
+def julia_batch(real_cs,imag_cs,width,height,iters,bounds=JULIA_BOUNDS,
+                backend=None,precision='float32'):
+    min_x, max_x, min_y, max_y = bounds
+    grid_min_x, grid_min_y, pixel_size_x, pixel_size_y = pixel_grid(
+        min_x,max_x,min_y,max_y,width,height)
+    return get_backend(backend).julia_batch(grid_min_x,grid_min_y,pixel_size_x,
+                                            pixel_size_y,width,height,iters,
+                                            real_cs,imag_cs,precision)
+
+
+def tile_atlas(fields,rows,columns):
+    count, height, width = fields.shape
+    if count != rows*columns:
+        raise ValueError('Expected %d fields for a %dx%d atlas, got %d'
+                         % (rows*columns, rows, columns, count))
+    return (fields.reshape((rows,columns,height,width)).transpose((0,2,1,3))
+            .reshape((rows*height,columns*width)))
+
+
+def julia_atlas(rows=32,columns=32,tile_size=128,iters=100,c_bounds=C_BOUNDS,
+                bounds=JULIA_BOUNDS,backend=None,precision='float32'):
+    real_cs, imag_cs = atlas_c_values(rows,columns,c_bounds)
+    fields = julia_batch(real_cs,imag_cs,tile_size,tile_size,iters,bounds,
+                         backend,precision)
+    return tile_atlas(fields,rows,columns)
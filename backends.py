@@ -0,0 +1,1466 @@
+from __future__ import division
+
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, localcontext
+from math import log, sqrt
+
+import numpy as np
+
+
+PERIOD_EPS = 1e-10
+CACHE_KERNELS = True
+WARM_PRECISIONS = ('float32','float64')
+PRECISIONS = ('float32','float64','double-double')
+# Smallest pixel size, relative to the largest coordinate, each tier renders
+# reliably. Near 1e-20 double-double and perturbation agree with an mpmath
+# reference on all but a fraction of a percent of pixels at 20000
+# iterations, and perturbation is about four times faster, so it takes over.
+PRECISION_LIMITS = OrderedDict([('float32',1e-5),
+                                ('float64',1e-13),
+                                ('double-double',1e-20)])
+DECIMAL_DIGITS = 1000
+# Kernel builds can start from the warm-up thread and a render at once;
+# re-entrant because a backend build also builds the shared point kernels.
+_build_lock = threading.RLock()
+
+def mandel_point(c,iters,eps):
+    real, imag = c.real, c.imag
+    q = (real - 0.25)*(real - 0.25) + imag*imag
+    if q*(q + (real - 0.25)) <= 0.25*imag*imag:
+        return 0.0, 0
+    if (real + 1.0)*(real + 1.0) + imag*imag <= 0.0625:
+        return 0.0, 0
+    z = c - c
+    h = 2.0 ** 40
+    log_h = log(log(h))/log(2.0)
+    old_z = z
+    steps = 0
+    limit = 1
+    for i in range(iters):
+        z = z*z + c
+        az = (z.real*z.real + z.imag*z.imag)
+        if az >= h:
+            return float(i) - log(log(az))/log(2.0) + log_h, i + 1
+        if abs(z.real - old_z.real) < eps and abs(z.imag - old_z.imag) < eps:
+            return 0.0, i + 1
+        steps += 1
+        if steps == limit:
+            old_z = z
+            steps = 0
+            limit *= 2
+    return 0.0, iters
+
+
+def julia_point(z,c,iters,eps):
+    h = 2.0 ** 40
+    log_h = log(log(h))/log(2.0)
+    old_z = z
+    steps = 0
+    limit = 1
+    for i in range(iters):
+        z = z*z + c
+        az = (z.real*z.real + z.imag*z.imag)
+        if az >= h:
+            return float(i) - log(log(az))/log(2.0) + log_h, i + 1
+        if abs(z.real - old_z.real) < eps and abs(z.imag - old_z.imag) < eps:
+            return 0.0, i + 1
+        steps += 1
+        if steps == limit:
+            old_z = z
+            steps = 0
+            limit *= 2
+    return 0.0, iters
+
+
+def mandel_distance_point(c,iters,eps):
+    real, imag = c.real, c.imag
+    q = (real - 0.25)*(real - 0.25) + imag*imag
+    if q*(q + (real - 0.25)) <= 0.25*imag*imag:
+        return 0.0
+    if (real + 1.0)*(real + 1.0) + imag*imag <= 0.0625:
+        return 0.0
+    z = c - c
+    dz = 0.0j
+    h = 2.0 ** 40
+    old_z = z
+    steps = 0
+    limit = 1
+    for i in range(iters):
+        dz = 2.0*z*dz + 1.0
+        z = z*z + c
+        az = (z.real*z.real + z.imag*z.imag)
+        if az >= h:
+            mag = dz.real*dz.real + dz.imag*dz.imag
+            if not 0.0 < mag < 1e300:
+                return 0.0
+            return 0.5*log(az)*sqrt(az/mag)
+        if abs(z.real - old_z.real) < eps and abs(z.imag - old_z.imag) < eps:
+            return 0.0
+        steps += 1
+        if steps == limit:
+            old_z = z
+            steps = 0
+            limit *= 2
+    return 0.0
+
+
+def julia_distance_point(z,c,iters,eps):
+    dz = 1.0 + 0.0j
+    h = 2.0 ** 40
+    old_z = z
+    steps = 0
+    limit = 1
+    for i in range(iters):
+        dz = 2.0*z*dz
+        z = z*z + c
+        az = (z.real*z.real + z.imag*z.imag)
+        if az >= h:
+            mag = dz.real*dz.real + dz.imag*dz.imag
+            if not 0.0 < mag < 1e300:
+                return 0.0
+            return 0.5*log(az)*sqrt(az/mag)
+        if abs(z.real - old_z.real) < eps and abs(z.imag - old_z.imag) < eps:
+            return 0.0
+        steps += 1
+        if steps == limit:
+            old_z = z
+            steps = 0
+            limit *= 2
+    return 0.0
+
+
+def subdivide_step(out,settled,stack,top,lines,min_size):
+    # One Mariani-Silver step on the rectangles in stack[:top], whose borders
+    # are already in out. Rectangles with a single integer escape count on
+    # the border are filled; the first one that needs pixels fills lines
+    # with (x, y, length, vertical) runs and returns how many there are.
+    # settled is False for pixels the interior or periodicity shortcut set
+    # to 0, which do not prove the orbit stayed bounded for the budget.
+    while top:
+        top -= 1
+        x, y, w, h = stack[top,0], stack[top,1], stack[top,2], stack[top,3]
+        if w <= min_size or h <= min_size:
+            n = 0
+            if w > 2:
+                for row in range(y + 1,y + h - 1):
+                    lines[n,0], lines[n,1], lines[n,2], lines[n,3] = x + 1, row, w - 2, 0
+                    n += 1
+            if n:
+                return top, n
+            continue
+        count = np.ceil(out[y,x])
+        uniform = True
+        for i in range(x,x + w):
+            if (np.ceil(out[y,i]) != count or np.ceil(out[y + h - 1,i]) != count
+                    or not (settled[y,i] and settled[y + h - 1,i])):
+                uniform = False
+                break
+        if uniform:
+            for j in range(y + 1,y + h - 1):
+                if (np.ceil(out[j,x]) != count or np.ceil(out[j,x + w - 1]) != count
+                        or not (settled[j,x] and settled[j,x + w - 1])):
+                    uniform = False
+                    break
+        if uniform:
+            # Shortcut zeros are never settled, so a rectangle inside the
+            # cardioid or period-2 bulb is split down to MIN_SIZE rather
+            # than filled. Little is lost: the shortcut already makes those
+            # pixels almost free. Settling them cut the pixels computed on a
+            # cardioid view from 97% to 15% without changing its time, and
+            # let an escaping pixel be filled on the overview.
+            # Smooth values in a band with count i lie in (i - 1, i], so a
+            # convex blend of the border stays in the band.
+            for j in range(y + 1,y + h - 1):
+                ty = (j - y)/(h - 1)
+                for i in range(x + 1,x + w - 1):
+                    if count == 0:
+                        out[j,i] = 0.0
+                    else:
+                        tx = (i - x)/(w - 1)
+                        out[j,i] = 0.5*(((1 - ty)*out[y,i] + ty*out[y + h - 1,i])
+                                        + ((1 - tx)*out[j,x] + tx*out[j,x + w - 1]))
+            continue
+        half_w, half_h = w//2, h//2
+        lines[0,0], lines[0,1], lines[0,2], lines[0,3] = x + 1, y + half_h, w - 2, 0
+        lines[1,0], lines[1,1], lines[1,2], lines[1,3] = x + half_w, y + 1, half_h - 1, 1
+        lines[2,0], lines[2,1], lines[2,2], lines[2,3] = (x + half_w, y + half_h + 1,
+                                                          h - half_h - 2, 1)
+        for rect in ((x,y,half_w + 1,half_h + 1),
+                     (x + half_w,y,w - half_w,half_h + 1),
+                     (x,y + half_h,half_w + 1,h - half_h),
+                     (x + half_w,y + half_h,w - half_w,h - half_h)):
+            stack[top,0], stack[top,1], stack[top,2], stack[top,3] = rect
+            top += 1
+        return top, 3
+    return 0, 0
+
+
+def subdivide_start(x,y,w,h,stack,lines):
+    stack[0,0], stack[0,1], stack[0,2], stack[0,3] = x, y, w, h
+    lines[0,0], lines[0,1], lines[0,2], lines[0,3] = x, y, w, 0
+    lines[1,0], lines[1,1], lines[1,2], lines[1,3] = x, y + h - 1, w if h > 1 else 0, 0
+    lines[2,0], lines[2,1], lines[2,2], lines[2,3] = x, y + 1, h - 2, 1
+    lines[3,0], lines[3,1], lines[3,2], lines[3,3] = x + w - 1, y + 1, h - 2 if w > 1 else 0, 1
+    return 1, 4
+
+
+def double_double_points(jit):
+    # Pair-of-float64 arithmetic (Dekker/Knuth error-free transforms). The
+    # helpers are jitted with the caller's decorator so the same source
+    # serves the CPU and CUDA engines.
+    @jit
+    def two_sum(a,b):
+        s = a + b
+        bb = s - a
+        return s, (a - (s - bb)) + (b - bb)
+
+    @jit
+    def quick_two_sum(a,b):
+        s = a + b
+        return s, b - (s - a)
+
+    @jit
+    def two_prod(a,b):
+        p = a*b
+        t = 134217729.0*a
+        a_hi = t - (t - a)
+        a_lo = a - a_hi
+        t = 134217729.0*b
+        b_hi = t - (t - b)
+        b_lo = b - b_hi
+        return p, ((a_hi*b_hi - p) + a_hi*b_lo + a_lo*b_hi) + a_lo*b_lo
+
+    @jit
+    def dd_add(a_hi,a_lo,b_hi,b_lo):
+        s, e = two_sum(a_hi,b_hi)
+        return quick_two_sum(s,e + a_lo + b_lo)
+
+    @jit
+    def dd_mul(a_hi,a_lo,b_hi,b_lo):
+        p, e = two_prod(a_hi,b_hi)
+        return quick_two_sum(p,e + a_hi*b_lo + a_lo*b_hi)
+
+    @jit
+    def dd_iterate(zr_hi,zr_lo,zi_hi,zi_lo,cr_hi,cr_lo,ci_hi,ci_lo,iters,eps):
+        h = 2.0 ** 40
+        log_h = log(log(h))/log(2.0)
+        old_r_hi, old_r_lo, old_i_hi, old_i_lo = zr_hi, zr_lo, zi_hi, zi_lo
+        steps = 0
+        limit = 1
+        for i in range(iters):
+            rr_hi, rr_lo = dd_mul(zr_hi,zr_lo,zr_hi,zr_lo)
+            ii_hi, ii_lo = dd_mul(zi_hi,zi_lo,zi_hi,zi_lo)
+            ri_hi, ri_lo = dd_mul(zr_hi,zr_lo,zi_hi,zi_lo)
+            zr_hi, zr_lo = dd_add(rr_hi,rr_lo,-ii_hi,-ii_lo)
+            zr_hi, zr_lo = dd_add(zr_hi,zr_lo,cr_hi,cr_lo)
+            zi_hi, zi_lo = dd_add(2.0*ri_hi,2.0*ri_lo,ci_hi,ci_lo)
+            az = zr_hi*zr_hi + zi_hi*zi_hi
+            if az >= h:
+                return float(i) - log(log(az))/log(2.0) + log_h, i + 1
+            if (abs((zr_hi - old_r_hi) + (zr_lo - old_r_lo)) < eps and
+                    abs((zi_hi - old_i_hi) + (zi_lo - old_i_lo)) < eps):
+                return 0.0, i + 1
+            steps += 1
+            if steps == limit:
+                old_r_hi, old_r_lo, old_i_hi, old_i_lo = zr_hi, zr_lo, zi_hi, zi_lo
+                steps = 0
+                limit *= 2
+        return 0.0, iters
+
+    @jit
+    def dd_distance(zr_hi,zr_lo,zi_hi,zi_lo,cr_hi,cr_lo,ci_hi,ci_lo,dr,di,step,
+                    iters,eps):
+        # The derivative only needs float64; step is 1 for dz/dc, 0 for dz/dz0.
+        h = 2.0 ** 40
+        old_r_hi, old_r_lo, old_i_hi, old_i_lo = zr_hi, zr_lo, zi_hi, zi_lo
+        steps = 0
+        limit = 1
+        for i in range(iters):
+            dr, di = 2.0*(zr_hi*dr - zi_hi*di) + step, 2.0*(zr_hi*di + zi_hi*dr)
+            rr_hi, rr_lo = dd_mul(zr_hi,zr_lo,zr_hi,zr_lo)
+            ii_hi, ii_lo = dd_mul(zi_hi,zi_lo,zi_hi,zi_lo)
+            ri_hi, ri_lo = dd_mul(zr_hi,zr_lo,zi_hi,zi_lo)
+            zr_hi, zr_lo = dd_add(rr_hi,rr_lo,-ii_hi,-ii_lo)
+            zr_hi, zr_lo = dd_add(zr_hi,zr_lo,cr_hi,cr_lo)
+            zi_hi, zi_lo = dd_add(2.0*ri_hi,2.0*ri_lo,ci_hi,ci_lo)
+            az = zr_hi*zr_hi + zi_hi*zi_hi
+            if az >= h:
+                mag = dr*dr + di*di
+                if not 0.0 < mag < 1e300:
+                    return 0.0
+                return 0.5*log(az)*sqrt(az/mag)
+            if (abs((zr_hi - old_r_hi) + (zr_lo - old_r_lo)) < eps and
+                    abs((zi_hi - old_i_hi) + (zi_lo - old_i_lo)) < eps):
+                return 0.0
+            steps += 1
+            if steps == limit:
+                old_r_hi, old_r_lo, old_i_hi, old_i_lo = zr_hi, zr_lo, zi_hi, zi_lo
+                steps = 0
+                limit *= 2
+        return 0.0
+
+    @jit
+    def dd_mandel_distance(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps):
+        q = (cr_hi - 0.25)*(cr_hi - 0.25) + ci_hi*ci_hi
+        if q*(q + (cr_hi - 0.25)) < 0.25*ci_hi*ci_hi - 1e-12:
+            return 0.0
+        if (cr_hi + 1.0)*(cr_hi + 1.0) + ci_hi*ci_hi < 0.0625 - 1e-12:
+            return 0.0
+        return dd_distance(0.0,0.0,0.0,0.0,cr_hi,cr_lo,ci_hi,ci_lo,0.0,0.0,1.0,
+                           iters,eps)
+
+    @jit
+    def dd_julia_distance(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,iters,eps):
+        return dd_distance(zr_hi,zr_lo,zi_hi,zi_lo,real_c,0.0,imag_c,0.0,1.0,0.0,
+                           0.0,iters,eps)
+
+    @jit
+    def dd_mandel_point(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps):
+        q = (cr_hi - 0.25)*(cr_hi - 0.25) + ci_hi*ci_hi
+        if q*(q + (cr_hi - 0.25)) < 0.25*ci_hi*ci_hi - 1e-12:
+            return 0.0, 0
+        if (cr_hi + 1.0)*(cr_hi + 1.0) + ci_hi*ci_hi < 0.0625 - 1e-12:
+            return 0.0, 0
+        return dd_iterate(0.0,0.0,0.0,0.0,cr_hi,cr_lo,ci_hi,ci_lo,iters,eps)
+
+    @jit
+    def dd_julia_point(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,iters,eps):
+        return dd_iterate(zr_hi,zr_lo,zi_hi,zi_lo,real_c,0.0,imag_c,0.0,iters,eps)
+
+    @jit
+    def dd_coordinate(min_hi,min_lo,index,pixel_size):
+        p, e = two_prod(index*1.0,pixel_size)
+        return dd_add(min_hi,min_lo,p,e)
+
+    return (dd_mandel_point, dd_julia_point, dd_coordinate, dd_mandel_distance,
+            dd_julia_distance, dd_add, dd_mul)
+
+
+def to_decimal(value):
+    if isinstance(value,Decimal):
+        return value
+    if isinstance(value,(float,np.floating)):
+        # str() keeps only 12 significant digits of a float on Python 2.
+        return Decimal(repr(float(value)))
+    return Decimal(str(value).strip())
+
+
+def split_double(value):
+    if isinstance(value,(float,int,np.floating,np.integer)):
+        return float(value), 0.0
+    value = to_decimal(value)
+    hi = float(value)
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        lo = float(value - Decimal(hi))
+    return hi, lo
+
+
+def pixel_grid(min_x,max_x,min_y,max_y,width,height):
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        min_x, max_x = to_decimal(min_x), to_decimal(max_x)
+        min_y, max_y = to_decimal(min_y), to_decimal(max_y)
+        pixel_size_x = float((max_x - min_x) / width)
+        pixel_size_y = float((max_y - min_y) / height)
+    return min_x, min_y, pixel_size_x, pixel_size_y
+
+
+def select_precision(min_x,max_x,min_y,max_y,width,height):
+    grid_min_x, grid_min_y, pixel_size_x, pixel_size_y = pixel_grid(
+        min_x,max_x,min_y,max_y,width,height)
+    scale = max(abs(float(min_x)),abs(float(max_x)),
+                abs(float(min_y)),abs(float(max_y)),1.0)
+    relative = min(abs(pixel_size_x),abs(pixel_size_y))/scale
+    for precision, limit in PRECISION_LIMITS.items():
+        if relative >= limit:
+            return precision
+    return 'perturbation'
+
+
+def period_eps(pixel_size_x,pixel_size_y):
+    return min(PERIOD_EPS, 1e-3*min(abs(pixel_size_x),abs(pixel_size_y)))
+
+
+class Backend(object):
+    def __init__(self,name,build,precisions=PRECISIONS):
+        self.name = name
+        self.precisions = precisions
+        self._build = build
+        self._kernels = {}
+
+    def kernels(self,precision='float32'):
+        if precision not in self.precisions:
+            raise ValueError('Backend %r has no %r kernels, expected one of %s'
+                             % (self.name, precision, ', '.join(self.precisions)))
+        if precision not in self._kernels:
+            with _build_lock:
+                if precision not in self._kernels:
+                    self._kernels[precision] = self._build(precision)
+        return self._kernels[precision]
+
+    def grid_args(self,min_x,min_y,pixel_size_x,pixel_size_y,x_off,y_off,
+                  width,height,iters):
+        min_x_hi, min_x_lo = split_double(min_x)
+        min_y_hi, min_y_lo = split_double(min_y)
+        return (min_x_hi,min_x_lo,min_y_hi,min_y_lo,float(pixel_size_x),
+                float(pixel_size_y),int(x_off),int(y_off),int(width),int(height),
+                int(iters),period_eps(pixel_size_x,pixel_size_y))
+
+    def mandel(self,min_x,min_y,pixel_size_x,pixel_size_y,x_off,y_off,
+               width,height,iters,stats=None,precision='float32',out=None):
+        # out, if given, is a C-contiguous float32 (height, width) array the
+        # kernel fills in place.
+        mandel_grid = self.kernels(precision)[0]
+        if out is None:
+            out = np.empty((int(height),int(width)), dtype=np.float32)
+        M, skipped = mandel_grid(*(self.grid_args(min_x,min_y,pixel_size_x,
+                                                  pixel_size_y,x_off,y_off,
+                                                  width,height,iters) + (out,)))
+        record_skipped(stats,skipped)
+        return M
+
+    def julia(self,min_x,min_y,pixel_size_x,pixel_size_y,x_off,y_off,
+              width,height,iters,real_c,imag_c,stats=None,precision='float32',
+              out=None):
+        julia_grid = self.kernels(precision)[1]
+        if out is None:
+            out = np.empty((int(height),int(width)), dtype=np.float32)
+        args = self.grid_args(min_x,min_y,pixel_size_x,pixel_size_y,x_off,y_off,
+                              width,height,iters)
+        M, skipped = julia_grid(*(args + (float(real_c),float(imag_c),out)))
+        record_skipped(stats,skipped)
+        return M
+
+    def samples(self,min_x,min_y,pixel_size_x,pixel_size_y,xs,ys,iters,
+                real_c=None,imag_c=None,precision='float32'):
+        min_x_hi, min_x_lo = split_double(min_x)
+        min_y_hi, min_y_lo = split_double(min_y)
+        args = (min_x_hi,min_x_lo,min_y_hi,min_y_lo,float(pixel_size_x),
+                float(pixel_size_y),np.ascontiguousarray(xs,dtype=np.float64),
+                np.ascontiguousarray(ys,dtype=np.float64),int(iters),
+                period_eps(pixel_size_x,pixel_size_y))
+        if real_c is not None and imag_c is not None:
+            return self.kernels(precision)[3](*(args + (float(real_c),float(imag_c))))
+        return self.kernels(precision)[2](*args)
+
+    def julia_batch(self,min_x,min_y,pixel_size_x,pixel_size_y,width,height,
+                    iters,real_cs,imag_cs,precision='float32'):
+        args = self.grid_args(min_x,min_y,pixel_size_x,pixel_size_y,0,0,
+                              width,height,iters)
+        return self.kernels(precision)[6](*(args + (
+            np.ascontiguousarray(real_cs,dtype=np.float64),
+            np.ascontiguousarray(imag_cs,dtype=np.float64))))
+
+    def distance(self,min_x,min_y,pixel_size_x,pixel_size_y,x_off,y_off,
+                 width,height,iters,real_c=None,imag_c=None,precision='float32'):
+        args = self.grid_args(min_x,min_y,pixel_size_x,pixel_size_y,x_off,y_off,
+                              width,height,iters)
+        if real_c is not None and imag_c is not None:
+            return self.kernels(precision)[5](*(args + (float(real_c),float(imag_c))))
+        return self.kernels(precision)[4](*args)
+
+    def subdivide(self,min_x,min_y,pixel_size_x,pixel_size_y,width,height,iters,
+                  real_c=None,imag_c=None,block=64,min_size=8,stats=None,
+                  precision='float32'):
+        # Backends without a subdivision kernel (numpy, cuda) render every
+        # pixel and report all of them as computed.
+        julia = real_c is not None and imag_c is not None
+        subdivide = self.kernels(precision)[7]
+        if subdivide is None:
+            if julia:
+                M = self.julia(min_x,min_y,pixel_size_x,pixel_size_y,0,0,width,
+                               height,iters,real_c,imag_c,stats,precision)
+            else:
+                M = self.mandel(min_x,min_y,pixel_size_x,pixel_size_y,0,0,width,
+                                height,iters,stats,precision)
+            return M, width*height
+        args = self.grid_args(min_x,min_y,pixel_size_x,pixel_size_y,0,0,
+                              width,height,iters)
+        M, computed = subdivide(*(args + (float(real_c) if julia else 0.0,
+                                          float(imag_c) if julia else 0.0,
+                                          julia,int(block),int(min_size))))
+        return M, int(computed)
+
+    def __repr__(self):
+        return 'Backend(%r)' % self.name
+
+
+def record_skipped(stats,skipped):
+    if stats is None or skipped is None:
+        return
+    stats['skipped_iterations'] = stats.get('skipped_iterations',0) + int(skipped)
+
+
+_points_ready = False
+
+def _jit_points():
+    # The grid kernels call these through module globals rather than closure
+    # cells: numba hashes closure cells into the on-disk cache key, and a
+    # captured dispatcher pickles differently in every process.
+    global mandel_p, julia_p, mandel_d, julia_d
+    global dd_mandel_p, dd_julia_p, dd_coordinate, dd_mandel_d, dd_julia_d
+    global subdivide_s, subdivide_b, _points_ready
+    with _build_lock:
+        if _points_ready:
+            return
+        from numba import njit
+
+        jit = njit(nogil=True)
+        (dd_mandel_p, dd_julia_p, dd_coordinate,
+         dd_mandel_d, dd_julia_d) = double_double_points(jit)[:5]
+        mandel_d, julia_d = jit(mandel_distance_point), jit(julia_distance_point)
+        mandel_p, julia_p = jit(mandel_point), jit(julia_point)
+        subdivide_s, subdivide_b = jit(subdivide_step), jit(subdivide_start)
+        # Set last so no caller sees a partly filled set of globals.
+        _points_ready = True
+
+
+def _build_grid(parallel,precision):
+    from numba import njit, prange
+
+    if precision == 'double-double':
+        return _build_dd_grid(parallel)
+    float_t = np.float32 if precision == 'float32' else np.float64
+    complex_t = np.complex64 if precision == 'float32' else np.complex128
+    loop = prange if parallel else range
+    _jit_points()
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def mandel_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,out):
+        skipped = np.zeros(height, dtype=np.int64)
+        for y in loop(height):
+            imag = float_t(dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)[0])
+            for x in range(width):
+                real = float_t(dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)[0])
+                value, done = mandel_p(complex_t(complex(real,imag)),iters,eps)
+                out[y,x] = value
+                if value == 0.0:
+                    skipped[y] += iters - done
+        return out, skipped.sum()
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                   x_off,y_off,width,height,iters,eps,real_c,imag_c,out):
+        skipped = np.zeros(height, dtype=np.int64)
+        c = complex_t(complex(float_t(real_c),float_t(imag_c)))
+        for y in loop(height):
+            imag = float_t(dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)[0])
+            for x in range(width):
+                real = float_t(dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)[0])
+                value, done = julia_p(complex_t(complex(real,imag)),c,iters,eps)
+                out[y,x] = value
+                if value == 0.0:
+                    skipped[y] += iters - done
+        return out, skipped.sum()
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def mandel_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       xs,ys,iters,eps):
+        out = np.empty(xs.shape[0], dtype=np.float32)
+        for k in loop(xs.shape[0]):
+            real = float_t(dd_coordinate(min_x,min_x_lo,xs[k],pixel_size_x)[0])
+            imag = float_t(dd_coordinate(min_y,min_y_lo,ys[k],pixel_size_y)[0])
+            out[k] = mandel_p(complex_t(complex(real,imag)),iters,eps)[0]
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                      xs,ys,iters,eps,real_c,imag_c):
+        out = np.empty(xs.shape[0], dtype=np.float32)
+        c = complex_t(complex(float_t(real_c),float_t(imag_c)))
+        for k in loop(xs.shape[0]):
+            real = float_t(dd_coordinate(min_x,min_x_lo,xs[k],pixel_size_x)[0])
+            imag = float_t(dd_coordinate(min_y,min_y_lo,ys[k],pixel_size_y)[0])
+            out[k] = julia_p(complex_t(complex(real,imag)),c,iters,eps)[0]
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def mandel_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height,iters,eps):
+        out = np.empty((height,width), dtype=np.float32)
+        for y in loop(height):
+            imag = float_t(dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)[0])
+            for x in range(width):
+                real = float_t(dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)[0])
+                out[y,x] = mandel_d(complex_t(complex(real,imag)),iters,eps)
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       x_off,y_off,width,height,iters,eps,real_c,imag_c):
+        out = np.empty((height,width), dtype=np.float32)
+        c = complex_t(complex(float_t(real_c),float_t(imag_c)))
+        for y in loop(height):
+            imag = float_t(dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)[0])
+            for x in range(width):
+                real = float_t(dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)[0])
+                out[y,x] = julia_d(complex_t(complex(real,imag)),c,iters,eps)
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_batch(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,real_cs,imag_cs):
+        count = real_cs.shape[0]
+        out = np.empty((count,height,width), dtype=np.float32)
+        for row in loop(count*height):
+            k, y = row // height, row % height
+            c = complex_t(complex(float_t(real_cs[k]),float_t(imag_cs[k])))
+            imag = float_t(dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)[0])
+            for x in range(width):
+                real = float_t(dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)[0])
+                out[k,y,x] = julia_p(complex_t(complex(real,imag)),c,iters,eps)[0]
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def subdivide(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                  x_off,y_off,width,height,iters,eps,real_c,imag_c,julia,block,
+                  min_size):
+        out = np.empty((height,width), dtype=np.float32)
+        settled = np.empty((height,width), dtype=np.bool_)
+        columns = (width + block - 1)//block
+        count = columns*((height + block - 1)//block)
+        computed = np.zeros(count, dtype=np.int64)
+        c = complex_t(complex(float_t(real_c),float_t(imag_c)))
+        for b in loop(count):
+            x0, y0 = (b % columns)*block, (b // columns)*block
+            stack = np.empty((4*block,4), dtype=np.int64)
+            lines = np.empty((block + 4,4), dtype=np.int64)
+            top, n = subdivide_b(x0,y0,min(block,width - x0),min(block,height - y0),
+                                 stack,lines)
+            while n:
+                for k in range(n):
+                    for i in range(lines[k,2]):
+                        x = lines[k,0] + i*(1 - lines[k,3])
+                        y = lines[k,1] + i*lines[k,3]
+                        real = float_t(dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)[0])
+                        imag = float_t(dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)[0])
+                        z = complex_t(complex(real,imag))
+                        if julia:
+                            value, done = julia_p(z,c,iters,eps)
+                        else:
+                            value, done = mandel_p(z,iters,eps)
+                        out[y,x] = value
+                        settled[y,x] = value != 0.0 or done == iters
+                    computed[b] += max(lines[k,2],0)
+                top, n = subdivide_s(out,settled,stack,top,lines,min_size)
+        return out, computed.sum()
+
+    return (mandel_grid, julia_grid, mandel_samples, julia_samples,
+            mandel_distance, julia_distance, julia_batch, subdivide)
+
+
+def _build_dd_grid(parallel):
+    from numba import njit, prange
+
+    loop = prange if parallel else range
+    _jit_points()
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def mandel_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,out):
+        skipped = np.zeros(height, dtype=np.int64)
+        for y in loop(height):
+            ci_hi, ci_lo = dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)
+            for x in range(width):
+                cr_hi, cr_lo = dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)
+                value, done = dd_mandel_p(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps)
+                out[y,x] = value
+                if value == 0.0:
+                    skipped[y] += iters - done
+        return out, skipped.sum()
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                   x_off,y_off,width,height,iters,eps,real_c,imag_c,out):
+        skipped = np.zeros(height, dtype=np.int64)
+        for y in loop(height):
+            zi_hi, zi_lo = dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)
+            for x in range(width):
+                zr_hi, zr_lo = dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)
+                value, done = dd_julia_p(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,
+                                         iters,eps)
+                out[y,x] = value
+                if value == 0.0:
+                    skipped[y] += iters - done
+        return out, skipped.sum()
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def mandel_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       xs,ys,iters,eps):
+        out = np.empty(xs.shape[0], dtype=np.float32)
+        for k in loop(xs.shape[0]):
+            cr_hi, cr_lo = dd_coordinate(min_x,min_x_lo,xs[k],pixel_size_x)
+            ci_hi, ci_lo = dd_coordinate(min_y,min_y_lo,ys[k],pixel_size_y)
+            out[k] = dd_mandel_p(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps)[0]
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                      xs,ys,iters,eps,real_c,imag_c):
+        out = np.empty(xs.shape[0], dtype=np.float32)
+        for k in loop(xs.shape[0]):
+            zr_hi, zr_lo = dd_coordinate(min_x,min_x_lo,xs[k],pixel_size_x)
+            zi_hi, zi_lo = dd_coordinate(min_y,min_y_lo,ys[k],pixel_size_y)
+            out[k] = dd_julia_p(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,iters,eps)[0]
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def mandel_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height,iters,eps):
+        out = np.empty((height,width), dtype=np.float32)
+        for y in loop(height):
+            ci_hi, ci_lo = dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)
+            for x in range(width):
+                cr_hi, cr_lo = dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)
+                out[y,x] = dd_mandel_d(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps)
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       x_off,y_off,width,height,iters,eps,real_c,imag_c):
+        out = np.empty((height,width), dtype=np.float32)
+        for y in loop(height):
+            zi_hi, zi_lo = dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)
+            for x in range(width):
+                zr_hi, zr_lo = dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)
+                out[y,x] = dd_julia_d(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,
+                                      iters,eps)
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def julia_batch(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,real_cs,imag_cs):
+        count = real_cs.shape[0]
+        out = np.empty((count,height,width), dtype=np.float32)
+        for row in loop(count*height):
+            k, y = row // height, row % height
+            zi_hi, zi_lo = dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)
+            for x in range(width):
+                zr_hi, zr_lo = dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)
+                out[k,y,x] = dd_julia_p(zr_hi,zr_lo,zi_hi,zi_lo,real_cs[k],
+                                        imag_cs[k],iters,eps)[0]
+        return out
+
+    @njit(parallel=parallel, nogil=True, cache=CACHE_KERNELS)
+    def subdivide(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                  x_off,y_off,width,height,iters,eps,real_c,imag_c,julia,block,
+                  min_size):
+        out = np.empty((height,width), dtype=np.float32)
+        settled = np.empty((height,width), dtype=np.bool_)
+        columns = (width + block - 1)//block
+        count = columns*((height + block - 1)//block)
+        computed = np.zeros(count, dtype=np.int64)
+        for b in loop(count):
+            x0, y0 = (b % columns)*block, (b // columns)*block
+            stack = np.empty((4*block,4), dtype=np.int64)
+            lines = np.empty((block + 4,4), dtype=np.int64)
+            top, n = subdivide_b(x0,y0,min(block,width - x0),min(block,height - y0),
+                                 stack,lines)
+            while n:
+                for k in range(n):
+                    for i in range(lines[k,2]):
+                        x = lines[k,0] + i*(1 - lines[k,3])
+                        y = lines[k,1] + i*lines[k,3]
+                        r_hi, r_lo = dd_coordinate(min_x,min_x_lo,x_off + x,pixel_size_x)
+                        i_hi, i_lo = dd_coordinate(min_y,min_y_lo,y_off + y,pixel_size_y)
+                        if julia:
+                            value, done = dd_julia_p(r_hi,r_lo,i_hi,i_lo,real_c,
+                                                     imag_c,iters,eps)
+                        else:
+                            value, done = dd_mandel_p(r_hi,r_lo,i_hi,i_lo,iters,eps)
+                        out[y,x] = value
+                        settled[y,x] = value != 0.0 or done == iters
+                    computed[b] += max(lines[k,2],0)
+                top, n = subdivide_s(out,settled,stack,top,lines,min_size)
+        return out, computed.sum()
+
+    return (mandel_grid, julia_grid, mandel_samples, julia_samples,
+            mandel_distance, julia_distance, julia_batch, subdivide)
+
+
+def _build_parallel():
+    return Backend('parallel',lambda precision: _build_grid(True,precision))
+
+
+def _build_cpu():
+    return Backend('cpu',lambda precision: _build_grid(False,precision))
+
+
+NUMPY_CHUNK = 32
+
+def _build_numpy_grid(precision):
+    if precision == 'double-double':
+        return _build_numpy_dd_grid()
+    float_t = np.float32 if precision == 'float32' else np.float64
+    dd_coordinate = double_double_points(lambda f: f)[2]
+
+    def coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height):
+        real = dd_coordinate(min_x,min_x_lo,np.arange(x_off,x_off + width),
+                             pixel_size_x)[0].astype(float_t)
+        imag = dd_coordinate(min_y,min_y_lo,np.arange(y_off,y_off + height),
+                             pixel_size_y)[0].astype(float_t)
+        return np.tile(real,height), np.repeat(imag,width)
+
+    def sample_coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                           xs,ys):
+        return (dd_coordinate(min_x,min_x_lo,xs,pixel_size_x)[0].astype(float_t),
+                dd_coordinate(min_y,min_y_lo,ys,pixel_size_y)[0].astype(float_t))
+
+    def interior(cr,ci):
+        real, imag = cr.astype(np.float64), ci.astype(np.float64)
+        q = (real - 0.25)*(real - 0.25) + imag*imag
+        return ((q*(q + (real - 0.25)) <= 0.25*imag*imag) |
+                ((real + 1.0)*(real + 1.0) + imag*imag <= 0.0625))
+
+    def iterate(zr,zi,cr,ci,index,out,iters,eps):
+        # Active-set iteration: every NUMPY_CHUNK steps the escaped and
+        # periodic points are compacted away, so the work per step shrinks
+        # with the number of points still bounded. Real and imaginary parts
+        # are kept apart so every step rounds exactly like the numba kernels.
+        h = 2.0 ** 40
+        log_h = log(log(h))/log(2.0)
+        n = zr.shape[0]
+        old_r, old_i = zr.copy(), zi.copy()
+        rr = np.empty(n, dtype=float_t)
+        ii = np.empty(n, dtype=float_t)
+        az = np.empty(n, dtype=float_t)
+        alive = np.empty(n, dtype=np.bool_)
+        hit = np.empty(n, dtype=np.bool_)
+        scalar_c = np.ndim(cr) == 0
+        skipped = 0
+        steps, limit = 0, 1
+        i = 0
+        with np.errstate(over='ignore', invalid='ignore'):
+            while i < iters and n:
+                stop = min(i + NUMPY_CHUNK,iters)
+                alive[:n] = True
+                zr_n, zi_n, rr_n, ii_n, az_n = zr[:n], zi[:n], rr[:n], ii[:n], az[:n]
+                alive_n, hit_n = alive[:n], hit[:n]
+                cr_n = cr if scalar_c else cr[:n]
+                ci_n = ci if scalar_c else ci[:n]
+                while i < stop:
+                    np.multiply(zr_n,zr_n,out=rr_n)
+                    np.multiply(zi_n,zi_n,out=ii_n)
+                    np.multiply(zr_n,zi_n,out=zi_n)
+                    np.add(zi_n,zi_n,out=zi_n)
+                    np.add(zi_n,ci_n,out=zi_n)
+                    np.subtract(rr_n,ii_n,out=zr_n)
+                    np.add(zr_n,cr_n,out=zr_n)
+                    np.multiply(zr_n,zr_n,out=rr_n)
+                    np.multiply(zi_n,zi_n,out=ii_n)
+                    np.add(rr_n,ii_n,out=az_n)
+                    np.greater_equal(az_n,h,out=hit_n)
+                    hit_n &= alive_n
+                    escaped = np.flatnonzero(hit_n)
+                    if escaped.size:
+                        out[index[escaped]] = (i - np.log(np.log(az_n[escaped].astype(np.float64)))
+                                               /log(2.0) + log_h)
+                        alive_n[escaped] = False
+                    np.subtract(zr_n,old_r[:n],out=rr_n)
+                    np.less(np.abs(rr_n,out=rr_n),eps,out=hit_n)
+                    np.subtract(zi_n,old_i[:n],out=ii_n)
+                    hit_n &= np.abs(ii_n,out=ii_n) < eps
+                    hit_n &= alive_n
+                    periodic = np.count_nonzero(hit_n)
+                    if periodic:
+                        skipped += periodic*(iters - i - 1)
+                        alive_n &= ~hit_n
+                    steps += 1
+                    if steps == limit:
+                        old_r[:n] = zr_n
+                        old_i[:n] = zi_n
+                        steps = 0
+                        limit *= 2
+                    i += 1
+                keep = np.flatnonzero(alive_n)
+                m = keep.size
+                for state in (zr,zi,old_r,old_i,index) + (() if scalar_c else (cr,ci)):
+                    state[:m] = state[:n][keep]
+                n = m
+        return skipped
+
+    def distance_iterate(zr,zi,cr,ci,dr,di,step,index,out,iters):
+        # The derivative is tracked in float64 next to z; points are only
+        # compacted on escape, bounded ones simply run out of iterations.
+        h = 2.0 ** 40
+        scalar_c = np.ndim(cr) == 0
+        i = 0
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            while i < iters and zr.size:
+                stop = min(i + NUMPY_CHUNK,iters)
+                alive = np.ones(zr.size, dtype=np.bool_)
+                while i < stop:
+                    dr, di = 2.0*(zr*dr - zi*di) + step, 2.0*(zr*di + zi*dr)
+                    zr, zi = zr*zr - zi*zi + cr, 2*zr*zi + ci
+                    az = (zr*zr + zi*zi).astype(np.float64)
+                    escaped = np.flatnonzero((az >= h) & alive)
+                    if escaped.size:
+                        mag = dr[escaped]*dr[escaped] + di[escaped]*di[escaped]
+                        value = 0.5*np.log(az[escaped])*np.sqrt(az[escaped]/mag)
+                        value[~((mag > 0.0) & (mag < 1e300))] = 0.0
+                        out[index[escaped]] = value
+                        alive[escaped] = False
+                    i += 1
+                zr, zi, dr, di, index = zr[alive], zi[alive], dr[alive], di[alive], index[alive]
+                if not scalar_c:
+                    cr, ci = cr[alive], ci[alive]
+
+    def mandel_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,out):
+        cr, ci = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                             pixel_size_y,x_off,y_off,width,height)
+        flat = out.reshape(-1)
+        flat[:] = 0
+        index = np.flatnonzero(~interior(cr,ci))
+        skipped = iters*(cr.size - index.size)
+        zeros = np.zeros(index.size, dtype=float_t)
+        skipped += iterate(zeros,zeros.copy(),cr[index],ci[index],index,flat,
+                           iters,eps)
+        return out, skipped
+
+    def julia_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                   x_off,y_off,width,height,iters,eps,real_c,imag_c,out):
+        zr, zi = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                             pixel_size_y,x_off,y_off,width,height)
+        flat = out.reshape(-1)
+        flat[:] = 0
+        skipped = iterate(zr,zi,float_t(real_c),float_t(imag_c),
+                          np.arange(zr.size),flat,iters,eps)
+        return out, skipped
+
+    def mandel_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       xs,ys,iters,eps):
+        cr, ci = sample_coordinates(min_x,min_x_lo,min_y,min_y_lo,
+                                    pixel_size_x,pixel_size_y,xs,ys)
+        out = np.zeros(cr.size, dtype=np.float32)
+        index = np.flatnonzero(~interior(cr,ci))
+        zeros = np.zeros(index.size, dtype=float_t)
+        iterate(zeros,zeros.copy(),cr[index],ci[index],index,out,iters,eps)
+        return out
+
+    def julia_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                      xs,ys,iters,eps,real_c,imag_c):
+        zr, zi = sample_coordinates(min_x,min_x_lo,min_y,min_y_lo,
+                                    pixel_size_x,pixel_size_y,xs,ys)
+        out = np.zeros(zr.size, dtype=np.float32)
+        iterate(zr,zi,float_t(real_c),float_t(imag_c),np.arange(zr.size),out,
+                iters,eps)
+        return out
+
+    def mandel_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height,iters,eps):
+        cr, ci = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                             pixel_size_y,x_off,y_off,width,height)
+        out = np.zeros(width*height, dtype=np.float32)
+        index = np.flatnonzero(~interior(cr,ci))
+        zeros = np.zeros(index.size, dtype=float_t)
+        distance_iterate(zeros,zeros,cr[index],ci[index],np.zeros(index.size),
+                         np.zeros(index.size),1.0,index,out,iters)
+        return out.reshape((height,width))
+
+    def julia_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       x_off,y_off,width,height,iters,eps,real_c,imag_c):
+        zr, zi = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                             pixel_size_y,x_off,y_off,width,height)
+        out = np.zeros(width*height, dtype=np.float32)
+        distance_iterate(zr,zi,float_t(real_c),float_t(imag_c),np.ones(zr.size),
+                         np.zeros(zr.size),0.0,np.arange(zr.size),out,iters)
+        return out.reshape((height,width))
+
+    def julia_batch(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,real_cs,imag_cs):
+        # All c values share one active set, so the compaction works across
+        # the whole batch rather than per image.
+        zr, zi = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                             pixel_size_y,x_off,y_off,width,height)
+        count = real_cs.shape[0]
+        out = np.zeros(count*zr.size, dtype=np.float32)
+        iterate(np.tile(zr,count),np.tile(zi,count),
+                np.repeat(real_cs.astype(float_t),zr.size),
+                np.repeat(imag_cs.astype(float_t),zr.size),np.arange(out.size),
+                out,iters,eps)
+        return out.reshape((count,height,width))
+
+    return (mandel_grid, julia_grid, mandel_samples, julia_samples,
+            mandel_distance, julia_distance, julia_batch, None)
+
+
+def _build_numpy_dd_grid():
+    # The helpers are plain Python on float64 arrays here, so every step
+    # rounds exactly like the numba double-double kernels.
+    dd_coordinate, dd_add, dd_mul = [double_double_points(lambda f: f)[k]
+                                      for k in (2,5,6)]
+
+    def coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height):
+        real_hi, real_lo = dd_coordinate(min_x,min_x_lo,
+                                         np.arange(x_off,x_off + width),pixel_size_x)
+        imag_hi, imag_lo = dd_coordinate(min_y,min_y_lo,
+                                         np.arange(y_off,y_off + height),pixel_size_y)
+        return (np.tile(real_hi,height), np.tile(real_lo,height),
+                np.repeat(imag_hi,width), np.repeat(imag_lo,width))
+
+    def sample_coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                           xs,ys):
+        return (dd_coordinate(min_x,min_x_lo,xs,pixel_size_x) +
+                dd_coordinate(min_y,min_y_lo,ys,pixel_size_y))
+
+    def interior(cr,ci):
+        # The margin of dd_mandel_point: c is only tested on its high part.
+        q = (cr - 0.25)*(cr - 0.25) + ci*ci
+        return ((q*(q + (cr - 0.25)) < 0.25*ci*ci - 1e-12) |
+                ((cr + 1.0)*(cr + 1.0) + ci*ci < 0.0625 - 1e-12))
+
+    def square(zr_hi,zr_lo,zi_hi,zi_lo,cr_hi,cr_lo,ci_hi,ci_lo):
+        rr_hi, rr_lo = dd_mul(zr_hi,zr_lo,zr_hi,zr_lo)
+        ii_hi, ii_lo = dd_mul(zi_hi,zi_lo,zi_hi,zi_lo)
+        ri_hi, ri_lo = dd_mul(zr_hi,zr_lo,zi_hi,zi_lo)
+        zr_hi, zr_lo = dd_add(rr_hi,rr_lo,-ii_hi,-ii_lo)
+        zr_hi, zr_lo = dd_add(zr_hi,zr_lo,cr_hi,cr_lo)
+        zi_hi, zi_lo = dd_add(2.0*ri_hi,2.0*ri_lo,ci_hi,ci_lo)
+        return zr_hi, zr_lo, zi_hi, zi_lo
+
+    def iterate(z,c,index,out,iters,eps):
+        # The active-set loop of the float tiers on hi/lo pairs; z and c are
+        # (zr_hi, zr_lo, zi_hi, zi_lo) tuples, c of scalars for Julia sets.
+        h = 2.0 ** 40
+        log_h = log(log(h))/log(2.0)
+        scalar_c = np.ndim(c[0]) == 0
+        old = z
+        skipped = 0
+        steps, limit = 0, 1
+        i = 0
+        with np.errstate(over='ignore', invalid='ignore'):
+            while i < iters and index.size:
+                stop = min(i + NUMPY_CHUNK,iters)
+                alive = np.ones(index.size, dtype=np.bool_)
+                while i < stop:
+                    z = square(*(z + c))
+                    az = z[0]*z[0] + z[2]*z[2]
+                    escaped = np.flatnonzero((az >= h) & alive)
+                    if escaped.size:
+                        out[index[escaped]] = (i - np.log(np.log(az[escaped]))/log(2.0)
+                                               + log_h)
+                        alive[escaped] = False
+                    periodic = ((np.abs((z[0] - old[0]) + (z[1] - old[1])) < eps) &
+                                (np.abs((z[2] - old[2]) + (z[3] - old[3])) < eps) &
+                                alive)
+                    count = np.count_nonzero(periodic)
+                    if count:
+                        skipped += count*(iters - i - 1)
+                        alive &= ~periodic
+                    steps += 1
+                    if steps == limit:
+                        old = z
+                        steps = 0
+                        limit *= 2
+                    i += 1
+                keep = np.flatnonzero(alive)
+                z = tuple(part[keep] for part in z)
+                old = tuple(part[keep] for part in old)
+                index = index[keep]
+                if not scalar_c:
+                    c = tuple(part[keep] for part in c)
+        return skipped
+
+    def distance_iterate(z,c,dr,di,step,index,out,iters):
+        # As in the float tiers, the derivative only needs float64.
+        h = 2.0 ** 40
+        scalar_c = np.ndim(c[0]) == 0
+        i = 0
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            while i < iters and index.size:
+                stop = min(i + NUMPY_CHUNK,iters)
+                alive = np.ones(index.size, dtype=np.bool_)
+                while i < stop:
+                    dr, di = 2.0*(z[0]*dr - z[2]*di) + step, 2.0*(z[0]*di + z[2]*dr)
+                    z = square(*(z + c))
+                    az = z[0]*z[0] + z[2]*z[2]
+                    escaped = np.flatnonzero((az >= h) & alive)
+                    if escaped.size:
+                        mag = dr[escaped]*dr[escaped] + di[escaped]*di[escaped]
+                        value = 0.5*np.log(az[escaped])*np.sqrt(az[escaped]/mag)
+                        value[~((mag > 0.0) & (mag < 1e300))] = 0.0
+                        out[index[escaped]] = value
+                        alive[escaped] = False
+                    i += 1
+                z = tuple(part[alive] for part in z)
+                dr, di, index = dr[alive], di[alive], index[alive]
+                if not scalar_c:
+                    c = tuple(part[alive] for part in c)
+
+    def mandel_points(c,out,iters,eps):
+        index = np.flatnonzero(~interior(c[0],c[2]))
+        zeros = np.zeros(index.size)
+        skipped = iterate((zeros,) * 4,tuple(part[index] for part in c),index,
+                          out,iters,eps)
+        return skipped + iters*(c[0].size - index.size)
+
+    def mandel_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,out):
+        c = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height)
+        flat = out.reshape(-1)
+        flat[:] = 0
+        return out, mandel_points(c,flat,iters,eps)
+
+    def julia_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                   x_off,y_off,width,height,iters,eps,real_c,imag_c,out):
+        z = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height)
+        flat = out.reshape(-1)
+        flat[:] = 0
+        skipped = iterate(z,(real_c,0.0,imag_c,0.0),np.arange(z[0].size),flat,
+                          iters,eps)
+        return out, skipped
+
+    def mandel_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       xs,ys,iters,eps):
+        c = sample_coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                               pixel_size_y,xs,ys)
+        out = np.zeros(c[0].size, dtype=np.float32)
+        mandel_points(c,out,iters,eps)
+        return out
+
+    def julia_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                      xs,ys,iters,eps,real_c,imag_c):
+        z = sample_coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                               pixel_size_y,xs,ys)
+        out = np.zeros(z[0].size, dtype=np.float32)
+        iterate(z,(real_c,0.0,imag_c,0.0),np.arange(z[0].size),out,iters,eps)
+        return out
+
+    def mandel_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height,iters,eps):
+        c = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height)
+        out = np.zeros(width*height, dtype=np.float32)
+        index = np.flatnonzero(~interior(c[0],c[2]))
+        zeros = np.zeros(index.size)
+        distance_iterate((zeros,) * 4,tuple(part[index] for part in c),zeros,
+                         zeros,1.0,index,out,iters)
+        return out.reshape((height,width))
+
+    def julia_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       x_off,y_off,width,height,iters,eps,real_c,imag_c):
+        z = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height)
+        out = np.zeros(width*height, dtype=np.float32)
+        distance_iterate(z,(real_c,0.0,imag_c,0.0),np.ones(z[0].size),
+                         np.zeros(z[0].size),0.0,np.arange(z[0].size),out,iters)
+        return out.reshape((height,width))
+
+    def julia_batch(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,real_cs,imag_cs):
+        z = coordinates(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height)
+        count, size = real_cs.shape[0], z[0].size
+        out = np.zeros(count*size, dtype=np.float32)
+        zeros = np.zeros(count*size)
+        iterate(tuple(np.tile(part,count) for part in z),
+                (np.repeat(real_cs,size),zeros,np.repeat(imag_cs,size),zeros),
+                np.arange(out.size),out,iters,eps)
+        return out.reshape((count,height,width))
+
+    return (mandel_grid, julia_grid, mandel_samples, julia_samples,
+            mandel_distance, julia_distance, julia_batch, None)
+
+
+def _build_numpy():
+    return Backend('numpy',_build_numpy_grid)
+
+
+cuda_sigs = {
+    'float32': ('float32(uint32,float64,float64,float64,float64,float64,float64,'
+                'uint32,uint32,uint32,uint32,float32)'),
+    'float64': ('float32(uint32,float64,float64,float64,float64,float64,float64,'
+                'uint32,uint32,uint32,uint32,float64)'),
+    'double-double': ('float32(uint32,float64,float64,float64,float64,float64,'
+                      'float64,uint32,uint32,uint32,uint32,float64)'),
+}
+
+cuda_sample_sigs = {
+    'float32': ('float32(float64,float64,float64,float64,float64,float64,float64,'
+                'float64,uint32,float32)'),
+    'float64': ('float32(float64,float64,float64,float64,float64,float64,float64,'
+                'float64,uint32,float64)'),
+    'double-double': ('float32(float64,float64,float64,float64,float64,float64,'
+                      'float64,float64,uint32,float64)'),
+}
+
+def _build_cuda_kernels(precision):
+    from numba import cuda, vectorize
+
+    mandel_sig = cuda_sigs[precision]
+    julia_sig = mandel_sig[:-1] + ',float64,float64)'
+    mandel_sample_sig = cuda_sample_sigs[precision]
+    julia_sample_sig = mandel_sample_sig[:-1] + ',float64,float64)'
+    float_t = np.float32 if precision == 'float32' else np.float64
+
+    if precision == 'double-double':
+        (dd_mandel_p, dd_julia_p, dd_coordinate,
+         dd_mandel_d, dd_julia_d) = double_double_points(cuda.jit(device=True))[:5]
+
+        @vectorize([mandel_sig], target='cuda')
+        def mandel(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                   x_off,y_off,width,iters,eps):
+            cr_hi, cr_lo = dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)
+            ci_hi, ci_lo = dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)
+            return dd_mandel_p(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps)[0]
+
+        @vectorize([julia_sig], target='cuda')
+        def julia(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                  x_off,y_off,width,iters,eps,real_c,imag_c):
+            zr_hi, zr_lo = dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)
+            zi_hi, zi_lo = dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)
+            return dd_julia_p(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,iters,eps)[0]
+
+        @vectorize([mandel_sample_sig], target='cuda')
+        def mandel_sample(x,y,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                          pixel_size_y,iters,eps):
+            cr_hi, cr_lo = dd_coordinate(min_x,min_x_lo,x,pixel_size_x)
+            ci_hi, ci_lo = dd_coordinate(min_y,min_y_lo,y,pixel_size_y)
+            return dd_mandel_p(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps)[0]
+
+        @vectorize([julia_sample_sig], target='cuda')
+        def julia_sample(x,y,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                         pixel_size_y,iters,eps,real_c,imag_c):
+            zr_hi, zr_lo = dd_coordinate(min_x,min_x_lo,x,pixel_size_x)
+            zi_hi, zi_lo = dd_coordinate(min_y,min_y_lo,y,pixel_size_y)
+            return dd_julia_p(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,iters,eps)[0]
+
+        @vectorize([mandel_sig], target='cuda')
+        def mandel_de(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                      x_off,y_off,width,iters,eps):
+            cr_hi, cr_lo = dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)
+            ci_hi, ci_lo = dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)
+            return dd_mandel_d(cr_hi,cr_lo,ci_hi,ci_lo,iters,eps)
+
+        @vectorize([julia_sig], target='cuda')
+        def julia_de(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                     x_off,y_off,width,iters,eps,real_c,imag_c):
+            zr_hi, zr_lo = dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)
+            zi_hi, zi_lo = dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)
+            return dd_julia_d(zr_hi,zr_lo,zi_hi,zi_lo,real_c,imag_c,iters,eps)
+    else:
+        # Coordinates come from the split origin in float64, as on the CPU,
+        # and are only then rounded to the tier's float type.
+        from numba import float32, float64
+        coord_t = float32 if precision == 'float32' else float64
+        dd_coordinate = double_double_points(cuda.jit(device=True))[2]
+        mandel_p = cuda.jit(device=True)(mandel_point)
+        julia_p = cuda.jit(device=True)(julia_point)
+        mandel_d = cuda.jit(device=True)(mandel_distance_point)
+        julia_d = cuda.jit(device=True)(julia_distance_point)
+
+        @vectorize([mandel_sig], target='cuda')
+        def mandel(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                   x_off,y_off,width,iters,eps):
+            real = coord_t(dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)[0])
+            imag = coord_t(dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)[0])
+            return mandel_p(complex(real,imag),iters,eps)[0]
+
+        @vectorize([julia_sig], target='cuda')
+        def julia(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                  x_off,y_off,width,iters,eps,real_c,imag_c):
+            real = coord_t(dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)[0])
+            imag = coord_t(dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)[0])
+            return julia_p(complex(real,imag),complex(real_c,imag_c),iters,eps)[0]
+
+        @vectorize([mandel_sample_sig], target='cuda')
+        def mandel_sample(x,y,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                          pixel_size_y,iters,eps):
+            real = coord_t(dd_coordinate(min_x,min_x_lo,x,pixel_size_x)[0])
+            imag = coord_t(dd_coordinate(min_y,min_y_lo,y,pixel_size_y)[0])
+            return mandel_p(complex(real,imag),iters,eps)[0]
+
+        @vectorize([julia_sample_sig], target='cuda')
+        def julia_sample(x,y,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,
+                         pixel_size_y,iters,eps,real_c,imag_c):
+            real = coord_t(dd_coordinate(min_x,min_x_lo,x,pixel_size_x)[0])
+            imag = coord_t(dd_coordinate(min_y,min_y_lo,y,pixel_size_y)[0])
+            return julia_p(complex(real,imag),complex(real_c,imag_c),iters,eps)[0]
+
+        @vectorize([mandel_sig], target='cuda')
+        def mandel_de(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                      x_off,y_off,width,iters,eps):
+            real = coord_t(dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)[0])
+            imag = coord_t(dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)[0])
+            return mandel_d(complex(real,imag),iters,eps)
+
+        @vectorize([julia_sig], target='cuda')
+        def julia_de(tid,min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                     x_off,y_off,width,iters,eps,real_c,imag_c):
+            real = coord_t(dd_coordinate(min_x,min_x_lo,x_off + tid % width,
+                                         pixel_size_x)[0])
+            imag = coord_t(dd_coordinate(min_y,min_y_lo,y_off + tid // width,
+                                         pixel_size_y)[0])
+            return julia_d(complex(real,imag),complex(real_c,imag_c),iters,eps)
+
+    def mandel_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,out):
+        tids = np.arange(width*height, dtype=np.uint32)
+        out[...] = mandel(tids,np.float64(min_x),np.float64(min_x_lo),np.float64(min_y),
+                      np.float64(min_y_lo),np.float64(pixel_size_x),
+                      np.float64(pixel_size_y),np.uint32(x_off),np.uint32(y_off),
+                      np.uint32(width),np.uint32(iters),
+                      float_t(eps)).reshape((height,width))
+        return out, None
+
+    def julia_grid(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                   x_off,y_off,width,height,iters,eps,real_c,imag_c,out):
+        tids = np.arange(width*height, dtype=np.uint32)
+        out[...] = julia(tids,np.float64(min_x),np.float64(min_x_lo),np.float64(min_y),
+                     np.float64(min_y_lo),np.float64(pixel_size_x),
+                     np.float64(pixel_size_y),np.uint32(x_off),np.uint32(y_off),
+                     np.uint32(width),np.uint32(iters),float_t(eps),
+                     np.float64(real_c),np.float64(imag_c)).reshape((height,width))
+        return out, None
+
+    def mandel_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       xs,ys,iters,eps):
+        return mandel_sample(xs,ys,np.float64(min_x),np.float64(min_x_lo),np.float64(min_y),
+                             np.float64(min_y_lo),np.float64(pixel_size_x),
+                             np.float64(pixel_size_y),np.uint32(iters),float_t(eps))
+
+    def julia_samples(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                      xs,ys,iters,eps,real_c,imag_c):
+        return julia_sample(xs,ys,np.float64(min_x),np.float64(min_x_lo),np.float64(min_y),
+                            np.float64(min_y_lo),np.float64(pixel_size_x),
+                            np.float64(pixel_size_y),np.uint32(iters),float_t(eps),
+                            np.float64(real_c),np.float64(imag_c))
+
+    def mandel_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                        x_off,y_off,width,height,iters,eps):
+        tids = np.arange(width*height, dtype=np.uint32)
+        return mandel_de(tids,np.float64(min_x),np.float64(min_x_lo),np.float64(min_y),
+                         np.float64(min_y_lo),np.float64(pixel_size_x),
+                         np.float64(pixel_size_y),np.uint32(x_off),np.uint32(y_off),
+                         np.uint32(width),np.uint32(iters),
+                         float_t(eps)).reshape((height,width))
+
+    def julia_distance(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                       x_off,y_off,width,height,iters,eps,real_c,imag_c):
+        tids = np.arange(width*height, dtype=np.uint32)
+        return julia_de(tids,np.float64(min_x),np.float64(min_x_lo),np.float64(min_y),
+                        np.float64(min_y_lo),np.float64(pixel_size_x),
+                        np.float64(pixel_size_y),np.uint32(x_off),np.uint32(y_off),
+                        np.uint32(width),np.uint32(iters),float_t(eps),
+                        np.float64(real_c),np.float64(imag_c)).reshape((height,width))
+
+    def julia_batch(min_x,min_x_lo,min_y,min_y_lo,pixel_size_x,pixel_size_y,
+                    x_off,y_off,width,height,iters,eps,real_cs,imag_cs):
+        count = real_cs.shape[0]
+        tids = np.tile(np.arange(width*height, dtype=np.uint32),count)
+        return julia(tids,np.float64(min_x),np.float64(min_x_lo),np.float64(min_y),
+                     np.float64(min_y_lo),np.float64(pixel_size_x),
+                     np.float64(pixel_size_y),np.uint32(x_off),np.uint32(y_off),
+                     np.uint32(width),np.uint32(iters),float_t(eps),
+                     np.repeat(real_cs,width*height),
+                     np.repeat(imag_cs,width*height)).reshape((count,height,width))
+
+    return (mandel_grid, julia_grid, mandel_samples, julia_samples,
+            mandel_distance, julia_distance, julia_batch, None)
+
+
+def _build_cuda():
+    return Backend('cuda',_build_cuda_kernels)
+
+
+def _cuda_available():
+    try:
+        from numba import cuda
+        return bool(cuda.is_available())
+    except Exception:
+        return False
+
+
+def _numba_available():
+    try:
+        import numba
+    except ImportError:
+        return False
+    return True
+
+
+_registry = OrderedDict()
+_loaded = {}
+
+def register_backend(name,builder,available=None):
+    _registry[name] = (builder,available)
+    _loaded.pop(name,None)
+
+
+def available_backends():
+    names = []
+    for name, (builder, available) in _registry.items():
+        if available is None or available():
+            names.append(name)
+    return names
+
+
+def get_backend(name=None):
+    if name is None or str(name).strip() in ('','auto'):
+        names = available_backends()
+        if not names:
+            raise RuntimeError('No fractal backend is available.')
+        name = names[0]
+    name = str(name).strip()
+    if name not in _registry:
+        raise ValueError('Unknown backend %r, expected one of %s'
+                         % (name, ', '.join(_registry)))
+    with _build_lock:
+        if name not in _loaded:
+            builder, available = _registry[name]
+            if available is not None and not available():
+                raise RuntimeError('Backend %r is not available on this machine.' % name)
+            _loaded[name] = builder()
+    return _loaded[name]
+
+
+def warm_up(names=None,precisions=WARM_PRECISIONS):
+    # Compiles every kernel once, or loads it from numba's on-disk cache,
+    # and returns the seconds each backend/precision pair took.
+    if names is None:
+        names = [name for name in available_backends() if name != 'numpy']
+    timings = OrderedDict()
+    for name in names:
+        backend = get_backend(name)
+        for precision in precisions:
+            if precision not in backend.precisions:
+                continue
+            start = time.time()
+            backend.mandel(0.0,0.0,1.0,1.0,0,0,2,2,1,precision=precision)
+            backend.julia(0.0,0.0,1.0,1.0,0,0,2,2,1,0.0,0.0,precision=precision)
+            backend.samples(0.0,0.0,1.0,1.0,[0.0],[0.0],1,precision=precision)
+            backend.samples(0.0,0.0,1.0,1.0,[0.0],[0.0],1,0.0,0.0,precision)
+            backend.distance(0.0,0.0,1.0,1.0,0,0,2,2,1,precision=precision)
+            backend.distance(0.0,0.0,1.0,1.0,0,0,2,2,1,0.0,0.0,precision)
+            backend.julia_batch(0.0,0.0,1.0,1.0,2,2,1,[0.0],[0.0],precision)
+            timings['%s/%s' % (name,precision)] = time.time() - start
+    return timings
+
+
+register_backend('cuda',_build_cuda,_cuda_available)
+register_backend('parallel',_build_parallel,_numba_available)
+register_backend('cpu',_build_cpu,_numba_available)
+register_backend('numpy',_build_numpy)
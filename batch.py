@@ -0,0 +1,97 @@
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+
+DEFAULTS = {'width': 1920,
+            'height': 1080,
+            'iters': 500,
+            'upsample': 1,
+            'shade': False,
+            'antialias': False,
+            'cmap': 'gnuplot2',
+            'precision': 'auto'}
+
+
+def load_jobs(path):
+    with open(path) as f:
+        spec = json.load(f)
+    if isinstance(spec,list):
+        spec = {'jobs': spec}
+    defaults = dict(DEFAULTS)
+    defaults.update(spec.get('defaults',{}))
+    jobs = []
+    for index, view in enumerate(spec.get('jobs',[])):
+        job = dict(defaults)
+        job.update(view)
+        for key in ('min_x','max_x','min_y','max_y'):
+            if key not in job:
+                raise ValueError('Job %d is missing %r' % (index,key))
+        job.setdefault('name','fractal_%04d' % index)
+        jobs.append(job)
+    return jobs
+
+
+def render_job(args):
+    job, output, backend = args
+    from export import export_fractal, open_writer
+    path = os.path.join(output,job['name'])
+    if not path.lower().endswith(('.png','.npy')):
+        path += '.png'
+    stats = {}
+    start = time.time()
+    if job['antialias']:
+        from fractal import create_fractal
+        image = create_fractal(job['min_x'],job['max_x'],job['min_y'],job['max_y'],
+                               int(job['width']),int(job['height']),int(job['iters']),
+                               job.get('real_c'),job.get('imag_c'),
+                               fancy=0 if job['shade'] else 1,cmap=job['cmap'],
+                               backend=backend,stats=stats,
+                               precision=job['precision'],antialias=True)
+        writer = open_writer(path,image.shape[1],image.shape[0])
+        writer.write_rows(image)
+        writer.close()
+    else:
+        export_fractal(path,job['min_x'],job['max_x'],job['min_y'],job['max_y'],
+                       int(job['width']),int(job['height']),int(job['iters']),
+                       job.get('real_c'),job.get('imag_c'),job['upsample'],
+                       0 if job['shade'] else 1,job['cmap'],backend,
+                       job['precision'],stats=stats)
+    return path, time.time() - start, stats.get('precision')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='fractal',
+                                     description='Render fractal views from a JSON job file.')
+    parser.add_argument('jobs', help='JSON file with a list of views or {"defaults": ..., "jobs": [...]}')
+    parser.add_argument('-o', '--output', default='.', help='output directory')
+    parser.add_argument('-b', '--backend', default='auto', help='kernel backend (cpu, parallel, cuda, numpy, auto)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of workers')
+    parser.add_argument('--pool', default='thread', choices=('thread','process'))
+    parser.add_argument('-n', '--dry-run', action='store_true', help='list the jobs without rendering')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = load_jobs(args.jobs)
+    if args.dry_run or not jobs:
+        for job in jobs:
+            print('%s: %sx%s, %s iterations' % (job['name'],job['width'],
+                                                job['height'],job['iters']))
+        return 0
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    from tiles import get_pool
+    pool = get_pool(args.pool,args.workers)
+    work = [(job,args.output,args.backend) for job in jobs]
+    for path, seconds, precision in pool.imap_unordered(render_job,work):
+        print('%s %.2fs (%s)' % (path,seconds,precision))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
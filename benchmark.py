@@ -0,0 +1,217 @@
+from __future__ import division, print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+VIEWS = OrderedDict([
+    ('overview', {'bounds': (-2.0,1.0,-1.0,1.0)}),
+    ('seahorse', {'bounds': (-0.761574 - 1/625.,-0.761574 + 1/625.,
+                             -0.0847596 - 1/625.,-0.0847596 + 1/625.)}),
+    ('deep', {'bounds': (-0.743643887037151 - 5e-12,-0.743643887037151 + 5e-12,
+                         0.131825904205330 - 5e-12,0.131825904205330 + 5e-12)}),
+    ('julia', {'bounds': (-1.6,1.6,-1.2,1.2),'c': (-0.7269,0.1889)}),
+])
+SIZES = OrderedDict([('small', (320,240)), ('medium', (960,540)),
+                     ('large', (1920,1080))])
+ITERS = (256,1000)
+REPEAT = 3
+THRESHOLD = 0.1
+
+
+def iteration_count(M,iters,stats):
+    # The kernels store the 0-based escape step less a log-log term in
+    # [0,1), so an escaped point ran ceil(M) + 1 steps; bounded ones ran the
+    # whole budget minus whatever the interior checks and periodicity test
+    # skipped.
+    escaped = M[M > 0]
+    bounded = M.size - escaped.size
+    return (int(np.ceil(escaped).sum()) + escaped.size + bounded*iters
+            - stats.get('skipped_iterations',0))
+
+
+def timed(func,repeat):
+    func()
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        result = func()
+        times.append(time.time() - start)
+    return result, times
+
+
+def record(name,times,pixels,iterations=None):
+    best = min(times)
+    result = OrderedDict([('name', name),
+                          ('seconds', best),
+                          ('median_seconds', float(np.median(times))),
+                          ('pixels_per_sec', pixels/best if best else None)])
+    if iterations is not None:
+        result['iterations'] = iterations
+        result['iterations_per_sec'] = iterations/best if best else None
+    return result
+
+
+def bench_case(view,size,iters,backend,repeat=REPEAT):
+    from fractal import compute_field, color_field, create_fractal
+    min_x, max_x, min_y, max_y = VIEWS[view]['bounds']
+    real_c, imag_c = VIEWS[view].get('c',(None,None))
+    width, height = SIZES[size]
+    prefix = '/'.join((view,size,str(iters),backend))
+    stats = {}
+    def kernel():
+        stats.clear()
+        return compute_field(min_x,max_x,min_y,max_y,width,height,iters,real_c,
+                             imag_c,backend,stats)
+    M, times = timed(kernel,repeat)
+    results = [record(prefix + '/kernel',times,M.size,iteration_count(M,iters,stats))]
+    results[0]['precision'] = stats.get('precision')
+    for fancy, label in ((0,'fancy'),(1,'fast')):
+        image, times = timed(lambda: color_field(M,1,fancy),repeat)
+        results.append(record(prefix + '/color-' + label,times,M.size))
+    image, times = timed(lambda: create_fractal(min_x,max_x,min_y,max_y,width,
+                                                height,iters,real_c,imag_c,
+                                                fancy=1,backend=backend),repeat)
+    results.append(record(prefix + '/end-to-end',times,image.shape[0]*image.shape[1]))
+    return results
+
+
+def run_suite(views=None,sizes=None,iters=ITERS,backends=None,repeat=REPEAT,
+              log=None):
+    from backends import available_backends
+    if backends is None:
+        backends = available_backends()
+    results = []
+    skipped = []
+    for view in views or VIEWS:
+        for size in sizes or ('small','medium'):
+            for count in iters:
+                for backend in backends:
+                    name = '/'.join((view,size,str(count),backend))
+                    try:
+                        case = bench_case(view,size,count,backend,repeat)
+                    except (ValueError,RuntimeError) as error:
+                        skipped.append({'name': name, 'reason': str(error)})
+                        continue
+                    if log is not None:
+                        for result in case:
+                            log(format_result(result))
+                    results.extend(case)
+    return {'meta': machine_info(), 'results': results, 'skipped': skipped}
+
+
+def startup_times(names=None):
+    # Runs the kernel warm-up in fresh processes against an empty numba
+    # cache directory: the first run compiles, the second loads from disk.
+    script = ('import json, time; start = time.time(); import backends; '
+              'timings = backends.warm_up(%r); '
+              'print(json.dumps({"kernels": timings, "total": time.time() - start}))'
+              % (names,))
+    cache_dir = tempfile.mkdtemp(prefix='fractal-numba-')
+    env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = OrderedDict()
+    try:
+        for run in ('cold','warm'):
+            output = subprocess.check_output([sys.executable,'-c',script],
+                                             cwd=here,env=env)
+            runs[run] = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(cache_dir,ignore_errors=True)
+    return runs
+
+
+def machine_info():
+    info = OrderedDict([('time', time.strftime('%Y-%m-%dT%H:%M:%S')),
+                        ('python', platform.python_version()),
+                        ('platform', platform.platform()),
+                        ('processor', platform.processor()),
+                        ('cpu_count', multiprocessing.cpu_count()),
+                        ('numpy', np.__version__)])
+    try:
+        import numba
+        info['numba'] = numba.__version__
+    except ImportError:
+        info['numba'] = None
+    return info
+
+
+def format_result(result):
+    line = '%-40s %9.4fs %12.3g px/s' % (result['name'],result['seconds'],
+                                         result['pixels_per_sec'] or 0)
+    if 'iterations_per_sec' in result:
+        line += ' %12.3g it/s' % (result['iterations_per_sec'] or 0)
+    return line
+
+
+def compare(baseline,current,threshold=THRESHOLD):
+    before = dict((result['name'], result) for result in baseline['results'])
+    regressions = []
+    for result in current['results']:
+        old = before.get(result['name'])
+        if old is None or not old['seconds']:
+            continue
+        change = result['seconds']/old['seconds'] - 1
+        if change > threshold:
+            regressions.append((result['name'],old['seconds'],result['seconds'],change))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmark',
+                                     description='Time kernels, colouring and full renders on canonical views.')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('-c', '--compare', help='baseline JSON file to check for regressions')
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help='slowdown that counts as a regression (0.1 = 10%%)')
+    parser.add_argument('-b', '--backends', nargs='+', help='backends to run (default: all available)')
+    parser.add_argument('--views', nargs='+', choices=list(VIEWS))
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES))
+    parser.add_argument('--iters', nargs='+', type=int, default=list(ITERS))
+    parser.add_argument('-r', '--repeat', type=int, default=REPEAT)
+    parser.add_argument('-q', '--quick', action='store_true',
+                        help='small size, one iteration count, one repeat')
+    parser.add_argument('--startup', action='store_true',
+                        help='also time cold and warm kernel start-up')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes, iters, repeat = args.sizes, args.iters, args.repeat
+    if args.quick:
+        sizes, iters, repeat = ['small'], [ITERS[0]], 1
+    report = run_suite(args.views,sizes,iters,args.backends,repeat,log=print)
+    for case in report['skipped']:
+        print('%-40s skipped: %s' % (case['name'],case['reason']))
+    if args.startup:
+        report['startup'] = startup_times(args.backends)
+        for run, timing in report['startup'].items():
+            print('%s start-up: %.2fs (%s)' % (run,timing['total'],', '.join(
+                '%s %.2fs' % item for item in sorted(timing['kernels'].items()))))
+    if args.output:
+        with open(args.output,'w') as f:
+            json.dump(report,f,indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline,report,args.threshold)
+        for name, old, new, change in regressions:
+            print('REGRESSION %s: %.4fs -> %.4fs (+%.0f%%)' % (name,old,new,100*change))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+from __future__ import division
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from decimal import localcontext
+
+import numpy as np
+
+from backends import DECIMAL_DIGITS, to_decimal
+
+TILE_QUANTUM = 256
+
+
+def quantize(origin,pixel_size):
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        steps = to_decimal(origin)/to_decimal(repr(float(pixel_size)))*TILE_QUANTUM
+        return int(steps.to_integral_value())
+
+
+def tile_key(tile,min_x,min_y,pixel_size_x,pixel_size_y,iters,real_c=None,
+             imag_c=None,precision='float32',backend='cpu'):
+    x, y, w, h = tile
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        origin_x = to_decimal(min_x) + x*to_decimal(repr(float(pixel_size_x)))
+        origin_y = to_decimal(min_y) + y*to_decimal(repr(float(pixel_size_y)))
+    if real_c is not None and imag_c is not None:
+        kind = ('julia',repr(float(real_c)),repr(float(imag_c)))
+    else:
+        kind = ('mandel',)
+    return kind + (quantize(origin_x,pixel_size_x),quantize(origin_y,pixel_size_y),
+                   '%.12e' % pixel_size_x,'%.12e' % pixel_size_y,int(w),int(h),
+                   int(iters),str(precision),str(backend))
+
+
+class TileCache(object):
+    def __init__(self,max_bytes=256*2**20,directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def digest(self,key):
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def path(self,key):
+        digest = self.digest(key)
+        return os.path.join(self.directory,digest[:2],digest + '.npy')
+
+    def get(self,key):
+        with self._lock:
+            if key in self._entries:
+                M = self._entries.pop(key)
+                self._entries[key] = M
+                self.hits += 1
+                return M
+        if self.directory is not None:
+            path = self.path(key)
+            if os.path.exists(path):
+                try:
+                    # Loaded in full: a memmap kept in the LRU would hold a
+                    # file descriptor open for as long as the tile stays cached.
+                    M = np.load(path)
+                except (IOError, ValueError):
+                    M = None
+                if M is not None:
+                    with self._lock:
+                        self.disk_hits += 1
+                    self._remember(key,M)
+                    return M
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self,key,M):
+        self._remember(key,M)
+        if self.directory is not None:
+            path = self.path(key)
+            if not os.path.exists(path):
+                shard = os.path.dirname(path)
+                if not os.path.isdir(shard):
+                    try:
+                        os.makedirs(shard)
+                    except OSError:
+                        pass
+                temp = '%s.%d.%d.tmp' % (path,os.getpid(),threading.current_thread().ident)
+                with open(temp,'wb') as f:
+                    np.save(f,M)
+                os.rename(temp,path)
+
+    def _remember(self,key,M):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = M
+            self._bytes += M.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'disk_hits': self.disk_hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'bytes': self._bytes}
+
+
+_default_cache = TileCache()
+
+def get_default_cache():
+    return _default_cache
+
+
+def set_default_cache(cache):
+    global _default_cache
+    _default_cache = cache
@@ -0,0 +1,166 @@
+from __future__ import division
+
+import numpy as np
+
+LUT_SIZE = 256
+BAND_ROWS = 256
+DISTANCE_PIXELS = 256
+
+_tables = {}
+_luts = {}
+
+def colormap_table(cmap='gnuplot2',size=LUT_SIZE):
+    cmap = str(cmap).strip()
+    key = (cmap,size)
+    if key not in _tables:
+        import matplotlib.cm
+        colormap = matplotlib.cm.get_cmap(cmap,size)
+        _tables[key] = colormap(np.arange(size)).astype(np.float32)
+    return _tables[key]
+
+
+def colormap_lut(cmap='gnuplot2',size=LUT_SIZE):
+    key = (str(cmap).strip(),size)
+    if key not in _luts:
+        _luts[key] = (colormap_table(cmap,size)*255 + 0.5).astype(np.uint8)
+    return _luts[key]
+
+
+def normalize(M,vmin=None,vmax=None):
+    if vmin is None:
+        vmin = float(M.min())
+    if vmax is None:
+        vmax = float(M.max())
+    if vmax == vmin:
+        return np.zeros(M.shape, dtype=np.float32)
+    return (M - np.float32(vmin))*np.float32(1.0/(vmax - vmin))
+
+
+def lut_indices(x,size):
+    indices = (x*size).astype(np.intp)
+    np.clip(indices,0,size - 1,out=indices)
+    return indices
+
+
+def apply_colormap(M,cmap='gnuplot2',vmin=None,vmax=None,size=LUT_SIZE):
+    lut = colormap_lut(cmap,size)
+    return lut[lut_indices(normalize(M,vmin,vmax),size)]
+
+
+def distance_shade(D,pixel_size,cmap='gnuplot2',scale=DISTANCE_PIXELS,
+                   size=LUT_SIZE):
+    # Distances are measured in output pixels on a log scale, so the boundary
+    # keeps the same width at any zoom; interior points have D == 0.
+    x = np.log1p(np.maximum(D,0)/np.float32(pixel_size))*np.float32(1.0/np.log1p(scale))
+    return colormap_lut(cmap,size)[lut_indices(x,size)]
+
+
+def light_direction(azdeg=180,altdeg=10):
+    az = np.radians(90 - azdeg)
+    alt = np.radians(altdeg)
+    return np.array([np.cos(az)*np.cos(alt), np.sin(az)*np.cos(alt), np.sin(alt)],
+                    dtype=np.float32)
+
+
+def band_intensity(M,start,stop,direction,vert_exag,dx,dy):
+    height = M.shape[0]
+    band = M[start:stop].astype(np.float32)*np.float32(vert_exag)
+    e_dx = np.gradient(band,np.float32(dx),axis=1)
+    above = M[max(start - 1,0):stop - 1].astype(np.float32)*np.float32(vert_exag)
+    below = M[start + 1:min(stop + 1,height)].astype(np.float32)*np.float32(vert_exag)
+    if start == 0:
+        above = np.concatenate((band[:1],above))
+    if stop == height:
+        below = np.concatenate((below,band[-1:]))
+    steps = np.full((stop - start,1),2.0,dtype=np.float32)
+    if start == 0:
+        steps[0] = 1.0
+    if stop == height:
+        steps[-1] = 1.0
+    # Rows run top to bottom, so the y spacing is negative (as in LightSource).
+    e_dy = (below - above)/(steps*np.float32(-dy))
+    intensity = direction[2] - e_dx*direction[0] - e_dy*direction[1]
+    intensity /= np.sqrt(e_dx*e_dx + e_dy*e_dy + 1)
+    return intensity
+
+
+def blend_hsv(rgb,intensity):
+    r, g, b = rgb[...,0], rgb[...,1], rgb[...,2]
+    val = np.maximum(np.maximum(r,g),b)
+    delta = val - np.minimum(np.minimum(r,g),b)
+    positive = delta > 0
+    safe_delta = np.where(positive,delta,1)
+    sat = np.where(val > 0,delta/np.where(val > 0,val,1),0)
+    hue = np.where(b == val,4 + (r - g)/safe_delta,
+          np.where(g == val,2 + (b - r)/safe_delta,(g - b)/safe_delta))
+    hue = np.where(positive,hue,0)
+    hue = (hue/6) % 1
+
+    bright = intensity > 0
+    dark = intensity < 0
+    colored = np.abs(sat) > 1e-10
+    sat = np.where(colored & bright,(1 - intensity)*sat,sat)
+    sat = np.where(colored & dark,(1 + intensity)*sat - intensity,sat)
+    val = np.where(bright,(1 - intensity)*val + intensity,val)
+    val = np.where(dark,(1 + intensity)*val,val)
+    np.clip(sat,0,1,out=sat)
+    np.clip(val,0,1,out=val)
+
+    sector = (hue*6).astype(np.int8)
+    f = hue*6 - sector
+    p = val*(1 - sat)
+    q = val*(1 - sat*f)
+    t = val*(1 - sat*(1 - f))
+    sector %= 6
+    out = np.empty(rgb.shape[:-1] + (3,), dtype=np.float32)
+    for channel, choices in enumerate(((val,q,p,p,t,val),
+                                       (t,val,val,q,p,p),
+                                       (p,p,t,val,val,q))):
+        out[...,channel] = np.choose(sector,choices)
+    grey = sat == 0
+    out[grey] = val[grey][:,None]
+    return out
+
+
+def intensity_range(M,vert_exag=1.25,dx=1,dy=1,azdeg=180,altdeg=10,
+                    band_rows=BAND_ROWS):
+    direction = light_direction(azdeg,altdeg)
+    imin, imax = np.inf, -np.inf
+    for start in range(0,M.shape[0],band_rows):
+        stop = min(start + band_rows,M.shape[0])
+        intensity = band_intensity(M,start,stop,direction,vert_exag,dx,dy)
+        imin = min(imin,float(intensity.min()))
+        imax = max(imax,float(intensity.max()))
+    return imin, imax
+
+
+def shade(M,cmap='gnuplot2',vert_exag=1.25,gamma=0.3,dx=1,dy=1,azdeg=180,
+          altdeg=10,size=LUT_SIZE,band_rows=BAND_ROWS,vmin=None,vmax=None,
+          irange=None):
+    height, width = M.shape
+    direction = light_direction(azdeg,altdeg)
+    table = colormap_table(cmap,size)
+    if vmin is None:
+        vmin = float(M.min())
+    if vmax is None:
+        vmax = float(M.max())
+    if irange is None:
+        irange = intensity_range(M,vert_exag,dx,dy,azdeg,altdeg,band_rows)
+    imin, imax = irange
+
+    out = np.empty((height,width,4), dtype=np.uint8)
+    for start in range(0,height,band_rows):
+        stop = min(start + band_rows,height)
+        intensity = band_intensity(M,start,stop,direction,vert_exag,dx,dy)
+        if imax - imin > 1e-6:
+            intensity -= imin
+            intensity /= (imax - imin)
+        np.clip(intensity,0,1,out=intensity)
+        x = normalize(M[start:stop],vmin,vmax)
+        np.clip(x,0,1,out=x)
+        np.power(x,np.float32(gamma),out=x)
+        rgba = table[lut_indices(x,size)]
+        rgb = blend_hsv(rgba,2*intensity - 1)
+        out[start:stop,:,:3] = (rgb*255 + 0.5).astype(np.uint8)
+        out[start:stop,:,3] = (rgba[...,3]*255 + 0.5).astype(np.uint8)
+    return out
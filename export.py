@@ -0,0 +1,152 @@
+from __future__ import division
+
+import struct
+import zlib
+from fractions import Fraction
+
+import numpy as np
+
+from backends import get_backend, pixel_grid, select_precision
+from perturbation import PerturbationReference
+from coloring import intensity_range
+from fractal import color_field, compute_field
+
+BAND_BYTES = 64*2**20
+PIXEL_BYTES = 112
+HALO_ROWS = 2
+HALO_BANDS = 4
+PREVIEW_WIDTH = 512
+
+
+class PNGWriter(object):
+    def __init__(self,path,width,height):
+        self.width = width
+        self.file = open(path,'wb')
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.chunk(b'IHDR',struct.pack('>IIBBBBB',width,height,8,6,0,0,0))
+        self.compressor = zlib.compressobj(6)
+
+    def chunk(self,tag,data):
+        self.file.write(struct.pack('>I',len(data)))
+        self.file.write(tag)
+        self.file.write(data)
+        self.file.write(struct.pack('>I',zlib.crc32(tag + data) & 0xffffffff))
+
+    def write_rows(self,rgba):
+        rows = np.zeros((rgba.shape[0],1 + self.width*4), dtype=np.uint8)
+        rows[:,1:] = rgba.reshape(rgba.shape[0],-1)
+        data = self.compressor.compress(rows.tobytes())
+        if data:
+            self.chunk(b'IDAT',data)
+
+    def close(self):
+        self.chunk(b'IDAT',self.compressor.flush())
+        self.chunk(b'IEND',b'')
+        self.file.close()
+
+
+class MemmapWriter(object):
+    def __init__(self,path,width,height):
+        self.array = np.lib.format.open_memmap(path,mode='w+',dtype=np.uint8,
+                                               shape=(height,width,4))
+        self.row = 0
+
+    def write_rows(self,rgba):
+        self.array[self.row:self.row + rgba.shape[0]] = rgba
+        self.row += rgba.shape[0]
+
+    def close(self):
+        self.array.flush()
+        del self.array
+
+
+def open_writer(path,width,height):
+    if str(path).lower().endswith('.npy'):
+        return MemmapWriter(path,width,height)
+    return PNGWriter(path,width,height)
+
+
+def band_height(width,upsample,halo,budget=BAND_BYTES):
+    # Output rows per band so that a band, halo included, stays within the
+    # budget; PIXEL_BYTES is the shading peak per field pixel. At poster
+    # widths the budget yields only a few rows, so bands never drop below
+    # HALO_BANDS halos and the re-shaded halo stays a small share of a band.
+    row_bytes = width*float(upsample)**2*PIXEL_BYTES
+    return max(HALO_BANDS*halo,int(budget//row_bytes) - 2*halo)
+
+
+def color_ranges(min_x,max_x,min_y,max_y,width,height,iters,real_c,imag_c,
+                 upsample,backend):
+    preview_width = min(PREVIEW_WIDTH,width)
+    preview_height = max(1,int(round(height*preview_width/width)))
+    M = compute_field(min_x,max_x,min_y,max_y,preview_width,preview_height,iters,
+                      real_c,imag_c,backend)
+    spacing = int(upsample)*upsample*width/preview_width
+    return float(M.min()), float(M.max()), intensity_range(M,1.25,spacing,spacing)
+
+
+def band_field(grid,y,rows,full_width,iters,real_c,imag_c,backend,precision,
+               stats,reference=None):
+    min_x, min_y, pixel_size_x, pixel_size_y = grid
+    if precision == 'perturbation':
+        return reference.field(y,rows,stats)
+    engine = get_backend(backend)
+    if real_c is not None and imag_c is not None:
+        return engine.julia(min_x,min_y,pixel_size_x,pixel_size_y,0,y,full_width,
+                            rows,iters,real_c,imag_c,stats,precision)
+    return engine.mandel(min_x,min_y,pixel_size_x,pixel_size_y,0,y,full_width,
+                         rows,iters,stats,precision)
+
+
+def export_fractal(path,min_x,max_x,min_y,max_y,width,height,iters,
+                   real_c=None,imag_c=None,upsample=1,fancy=True,
+                   cmap='gnuplot2',backend=None,precision='auto',
+                   band_rows=None,stats=None,progress=None):
+    try:
+        real_c, imag_c = float(real_c), float(imag_c)
+    except:
+        pass
+    upsample = Fraction(float(upsample)).limit_denominator(64)
+    step = upsample.denominator
+    halo = step*-(-HALO_ROWS//step)
+    if band_rows is None:
+        band_rows = band_height(width,upsample,halo)
+    band_rows = max(step,band_rows - band_rows % step)
+    full_width, full_height = int(upsample*width), int(upsample*height)
+    if precision == 'auto':
+        precision = select_precision(min_x,max_x,min_y,max_y,full_width,full_height)
+    if stats is not None:
+        stats['precision'] = precision
+    grid = pixel_grid(min_x,max_x,min_y,max_y,full_width,full_height)
+    vmin, vmax, irange = color_ranges(min_x,max_x,min_y,max_y,width,height,iters,
+                                      real_c,imag_c,float(upsample),backend)
+
+    reference = None
+    if precision == 'perturbation':
+        reference = PerturbationReference(min_x,max_x,min_y,max_y,full_width,
+                                          full_height,iters,real_c,imag_c,
+                                          backend)
+
+    writer = open_writer(path,width,height)
+    try:
+        # Each band reuses the field rows of the previous band's lower halo,
+        # so the kernel computes every field row exactly once.
+        M, field_top = np.empty((0,full_width), dtype=np.float32), 0
+        for start in range(0,height,band_rows):
+            stop = min(start + band_rows,height)
+            top, bottom = max(start - halo,0), min(stop + halo,height)
+            y, end = int(top*upsample), min(int(bottom*upsample),full_height)
+            M, field_top = M[y - field_top:], y
+            first = y + M.shape[0]
+            if end > first:
+                M = np.concatenate((M,band_field(grid,first,end - first,
+                                                 full_width,iters,real_c,imag_c,
+                                                 backend,precision,stats,
+                                                 reference)))
+            rgba = color_field(M,float(upsample),fancy,cmap,(bottom - top,width),
+                               vmin,vmax,irange)
+            writer.write_rows(rgba[start - top:stop - top])
+            if progress is not None:
+                progress(stop,height)
+    finally:
+        writer.close()
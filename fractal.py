@@ -1,118 +1,177 @@
 from __future__ import division
 
-from numba import vectorize
+from decimal import localcontext
 
 import numpy as np
-import matplotlib
-matplotlib.use('qt4agg')
-import matplotlib.pyplot as plt
 
-from matplotlib import colors
-
-from math import log
-
-from scipy.misc import imresize
-
-mandel_sig = 'float32(float32, float32, float32, float32, float32, uint32, uint32, uint32)'
-julia_sig = 'float32(float32,float32,float32,float32,float32,uint32,uint32,uint32,float32,float32)'
-
-@vectorize([mandel_sig], target='cuda')
-def mandel(tid,min_x,max_x,min_y,max_y,width,height,iters):
-    pixel_size_x = (max_x - min_x) / width
-    pixel_size_y = (max_y  - min_y) / height
-    
-    x = tid % width
-    y = tid / width
-    real = min_x + x*pixel_size_x
-    imag = min_y + y*pixel_size_y
-    c = complex(real,imag)
-    z = 0.0j
-    h = 2.0 ** 40
-    log_h = log(log(h))/log(2.0)
-    for i in range(iters):
-        z = z*z + c
-        az = (z.real*z.real + z.imag*z.imag)
-        if az >= h:
-            return float(i) - log(log(az))/log(2.0) + log_h
-    return 0.0
-
-
-@vectorize([julia_sig], target='cuda')
-def julia(tid,min_x,max_x,min_y,max_y,width,height,iters,real_c,imag_c):
-    pixel_size_x = (max_x - min_x) / width
-    pixel_size_y = (max_y  - min_y) / height
-    
-    x = tid % width
-    y = tid / width
-    real = min_x + x*pixel_size_x
-    imag = min_y + y*pixel_size_y
-    z = complex(real,imag)
-    c = complex(real_c,imag_c)
-    h = 2.0 ** 40
-    log_h = log(log(h))/log(2.0)
-    for i in range(iters):
-        z = z*z + c
-        az = (z.real*z.real + z.imag*z.imag)
-        if az >= h:
-            return float(i) - log(log(az))/log(2.0) + log_h
-    return 0.0
-
-def lighting(M,upsample,cmap='gnuplot2'):
-    light = colors.LightSource(180,10)
-    M = light.shade(M, cmap=plt.cm.get_cmap(cmap), vert_exag=1.25,
-            norm=colors.PowerNorm(0.3), blend_mode='hsv', 
-            dx=int(upsample), dy=int(upsample))
+from backends import get_backend, pixel_grid, select_precision, to_decimal
+from subdivide import subdivide_field
+from perturbation import perturbation_field, precision_digits
+from coloring import apply_colormap, distance_shade, shade
+from antialias import adaptive_image
+from profiling import stage
+
+def mandel(min_x,max_x,min_y,max_y,width,height,iters,backend=None,stats=None,
+           precision='float32'):
+    min_x, min_y, pixel_size_x, pixel_size_y = pixel_grid(min_x,max_x,min_y,max_y,
+                                                          width,height)
+    return get_backend(backend).mandel(min_x,min_y,pixel_size_x,pixel_size_y,
+                                       0,0,width,height,iters,stats,precision)
+
+
+def julia(min_x,max_x,min_y,max_y,width,height,iters,real_c,imag_c,backend=None,
+          stats=None,precision='float32'):
+    min_x, min_y, pixel_size_x, pixel_size_y = pixel_grid(min_x,max_x,min_y,max_y,
+                                                          width,height)
+    return get_backend(backend).julia(min_x,min_y,pixel_size_x,pixel_size_y,
+                                      0,0,width,height,iters,real_c,imag_c,
+                                      stats,precision)
+
+def lighting(M,upsample,cmap='gnuplot2',vmin=None,vmax=None,irange=None):
+    return shade(M, cmap, vert_exag=1.25, gamma=0.3,
+                 dx=int(upsample), dy=int(upsample),
+                 vmin=vmin, vmax=vmax, irange=irange)
+
+def compute_field(min_x,max_x,min_y,max_y,width,height,iters,
+                  real_c=None,imag_c=None,backend=None,stats=None,
+                  subdivide=False,deep=False,precision='auto'):
+    if precision == 'auto':
+        precision = select_precision(min_x,max_x,min_y,max_y,width,height)
+    if deep:
+        precision = 'perturbation'
+    if stats is not None:
+        stats['precision'] = precision
+    if precision == 'perturbation':
+        return perturbation_field(min_x,max_x,min_y,max_y,width,height,iters,
+                                  real_c,imag_c,stats,backend)
+    if subdivide:
+        return subdivide_field(min_x,max_x,min_y,max_y,width,height,iters,
+                               real_c,imag_c,backend,stats=stats,
+                               precision=precision)
+    if real_c is not None and imag_c is not None:
+        return julia(min_x,max_x,min_y,max_y,width,height,iters,real_c,imag_c,
+                     backend,stats,precision)
+    return mandel(min_x,max_x,min_y,max_y,width,height,iters,backend,stats,
+                  precision)
+
+def compute_distance(min_x,max_x,min_y,max_y,width,height,iters,
+                     real_c=None,imag_c=None,backend=None,stats=None,
+                     precision='auto'):
+    if precision == 'auto':
+        precision = select_precision(min_x,max_x,min_y,max_y,width,height)
+    if precision == 'perturbation':
+        raise ValueError('Distance estimation needs a direct precision tier, '
+                         'this view needs perturbation')
+    if stats is not None:
+        stats['precision'] = precision
+    min_x, min_y, pixel_size_x, pixel_size_y = pixel_grid(min_x,max_x,min_y,max_y,
+                                                          width,height)
+    return get_backend(backend).distance(min_x,min_y,pixel_size_x,pixel_size_y,
+                                         0,0,width,height,iters,real_c,imag_c,
+                                         precision)
+
+def to_uint8(M):
+    if M.dtype == np.uint8:
+        return M
+    return (np.clip(M,0.0,1.0)*255 + 0.5).astype(np.uint8)
+
+def color_field(M,upsample=1,fancy=True,cmap='gnuplot2',shape=None,
+                vmin=None,vmax=None,irange=None,profile=None):
+    cmap = str(cmap).strip()
+    if fancy == 0:
+        with stage(profile,'lighting') as step:
+            M = lighting(M,upsample,cmap,vmin,vmax,irange)
+            step.output(M)
+    else:
+        with stage(profile,'colormap') as step:
+            M = apply_colormap(M,cmap,vmin,vmax)
+            step.output(M)
+
+    if shape is not None and M.shape[:2] != tuple(shape):
+        with stage(profile,'resize') as step:
+            M = resize(M,shape)
+            step.output(M)
+    with stage(profile,'to_uint8') as step:
+        M = to_uint8(M)
     return M
 
+def resize(M,shape):
+    from scipy.misc import imresize
+    return imresize(M,tuple(shape),interp='bicubic')
+
 def create_fractal(min_x,max_x,min_y,max_y,width,height,iters,
                    real_c=None,imag_c=None,upsample=1,fancy=True,
-                   cmap='gnuplot2',debug=False):
+                   cmap='gnuplot2',debug=False,backend=None,stats=None,
+                   subdivide=False,deep=False,precision='auto',antialias=False,
+                   distance=False,profile=None):
     
-    min_x, max_x, min_y, max_y = float(min_x), float(max_x), float(min_y), float(max_y)
     try:
         real_c, imag_c = float(real_c), float(imag_c)
     except:
         pass
-    upsample = float(upsample)
-    ogwidth,ogheight = width,height
-    width,height = int(upsample*width),int(upsample*height)
-    cmap = str(cmap).strip()
-    tids = np.arange(width*height, dtype=np.float32)
-    
-    
-    if real_c is not None and imag_c is not None:
-        M = julia(tids,np.float32(min_x),np.float32(max_x),np.float32(min_y),
-                     np.float32(max_y),np.uint32(width),np.uint32(height),
-                     np.uint32(iters),np.float32(real_c),
-                     np.float32(imag_c)).reshape((height,width))        
-    else:
-        M = mandel(tids,np.float32(min_x),np.float32(max_x),np.float32(min_y),
-                     np.float32(max_y),np.uint32(width),np.uint32(height),
-                     np.uint32(iters)).reshape((height,width))
-    if fancy == 0:
-        M = lighting(M,upsample,cmap)
-    else:
-        cmap = plt.cm.ScalarMappable(cmap=cmap)
-
-        M = cmap.to_rgba(M)
-
-    if upsample != 1:
-        M = imresize(M,(ogheight,ogwidth),interp='bicubic')
+    if profile is not None:
+        profile.start_hook()
+    try:
+        M = render_image(min_x,max_x,min_y,max_y,width,height,iters,real_c,
+                         imag_c,upsample,fancy,cmap,backend,stats,subdivide,
+                         deep,precision,antialias,distance,profile)
+    finally:
+        if profile is not None:
+            profile.stop_hook()
+            profile.finish()
     
     if debug:
+        import matplotlib.pyplot as plt
         plt.imsave('debug.png', M)
 
     return M
 
+def render_image(min_x,max_x,min_y,max_y,width,height,iters,real_c,imag_c,
+                 upsample,fancy,cmap,backend,stats,subdivide,deep,precision,
+                 antialias,distance,profile):
+    if antialias:
+        with stage(profile,'antialias') as step:
+            M = adaptive_image(min_x,max_x,min_y,max_y,width,height,iters,
+                               real_c,imag_c,fancy,cmap,backend,
+                               'perturbation' if deep else precision,stats=stats)
+            step.output(M)
+        return M
+    upsample = float(upsample)
+    ogwidth,ogheight = width,height
+    width,height = int(upsample*width),int(upsample*height)
+    
+    if distance:
+        with stage(profile,'kernel') as step:
+            D = compute_distance(min_x,max_x,min_y,max_y,width,height,iters,
+                                 real_c,imag_c,backend,stats,precision)
+            step.output(D)
+        with stage(profile,'colormap') as step:
+            M = to_uint8(distance_shade(D,pixel_grid(min_x,max_x,min_y,max_y,
+                                                     width,height)[2]*upsample,cmap))
+            step.output(M)
+        if M.shape[:2] != (ogheight,ogwidth):
+            with stage(profile,'resize') as step:
+                M = resize(M,(ogheight,ogwidth))
+                step.output(M)
+        return M
+    with stage(profile,'kernel') as step:
+        M = compute_field(min_x,max_x,min_y,max_y,width,height,iters,
+                          real_c,imag_c,backend,stats,subdivide,deep,precision)
+        step.output(M)
+    return color_field(M,upsample,fancy,cmap,(ogheight,ogwidth),profile=profile)
+
 def calculate_new_coords(old_coords,roi_coords,width,height):
-    min_x, max_x, min_y, max_y = old_coords
-    min_x, max_x, min_y, max_y = float(min_x), float(max_x), float(min_y), float(max_y)
-    pixel_size_x = (max_x - min_x) / width
-    pixel_size_y = (max_y  - min_y) / height
-    return [min_x + pixel_size_x*roi_coords[0], min_x + pixel_size_x*roi_coords[1],
-            max_y - pixel_size_y*roi_coords[3], max_y - pixel_size_y*roi_coords[2]]
+    min_x, max_x, min_y, max_y = [to_decimal(coord) for coord in old_coords]
+    span = float(max_x - min_x)
+    with localcontext() as ctx:
+        ctx.prec = precision_digits(span*max(roi_coords[1] - roi_coords[0],1)/(width*width))
+        pixel_size_x = (max_x - min_x) / width
+        pixel_size_y = (max_y  - min_y) / height
+        return [min_x + pixel_size_x*roi_coords[0], min_x + pixel_size_x*roi_coords[1],
+                max_y - pixel_size_y*roi_coords[3], max_y - pixel_size_y*roi_coords[2]]
 
 def test_frac():
+    import matplotlib.pyplot as plt
     center_x = -0.761574
     center_y = -0.0847596
     zoom_val = 1/625.
@@ -138,4 +197,8 @@ def test_frac():
     
     plt.imsave('testnormal.png', M)
 
-#test_frac()
\ No newline at end of file
+#test_frac()
+
+if __name__ == '__main__':
+    from batch import main
+    raise SystemExit(main())
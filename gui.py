@@ -1,18 +1,45 @@
-from fractal import create_fractal, calculate_new_coords
+from fractal import color_field, calculate_new_coords
+from export import export_fractal
+from backends import available_backends, pixel_grid, select_precision, warm_up
+from tiles import render_tiles, display_rect
+from progressive import progressive_field, crop_field
+from pan import pan_field, view_coords
+from scheduler import RenderScheduler
+from adaptive import adaptive_iterations
+from preview import JuliaPreview, PREVIEW_SIZE
+from profiling import CProfileHook, RenderProfile, logger, stage
+from cache import get_default_cache
 import pyqtgraph as pg
-from scipy.ndimage import rotate
 from PyQt4 import QtGui, QtCore
 
 import sys
+import json
+import threading
+import time
+from functools import partial
 import numpy as np
+import matplotlib
+matplotlib.use('qt4agg')
 import matplotlib.pyplot as plt
 
-class FracThread(QtCore.QThread):
+PAN_STEPS = 16
+WARM_UP = True
+
+def warm_up_kernels():
+    timings = warm_up()
+    logger.info(json.dumps({'warm_up_ms': dict((name, round(1000*seconds,3))
+                                               for name, seconds in timings.items())}))
+
+class FracRender(QtCore.QObject):
     update = QtCore.pyqtSignal()
     image = QtCore.pyqtSignal(object)
+    tile = QtCore.pyqtSignal(object)
+    field = QtCore.pyqtSignal(object)
+    budget = QtCore.pyqtSignal(object)
     def __init__(self, parent, min_x,max_x,min_y,max_y,width,height,iters,
-                 real_c,imag_c,upsample,fancy,cmap):
-        super(FracThread, self).__init__(parent)
+                 real_c,imag_c,upsample,fancy,cmap,backend=None,key=None,
+                 progressive=False,hook=None):
+        super(FracRender, self).__init__(parent)
         self.min_x = min_x
         self.max_x = max_x
         self.min_y = min_y 
@@ -25,13 +52,135 @@ class FracThread(QtCore.QThread):
         self.upsample = upsample
         self.fancy = fancy
         self.cmap = cmap
-        
+        self.backend = backend
+        self.key = key
+        self.progressive = progressive
+        self.hook = hook
+        
+    def __call__(self,generation,cancelled):
+         profile = RenderProfile(self.hook,generation=generation,width=self.width,
+                                 height=self.height,upsample=float(self.upsample),
+                                 backend=self.backend,progressive=self.progressive)
+         profile.start_hook()
+         try:
+             image_data = self.draw(generation,cancelled,profile)
+         finally:
+             profile.stop_hook()
+         if image_data is not None and not cancelled():
+             self.image.emit((generation,image_data,profile))
+
+    def draw(self,generation,cancelled,profile):
+         upsample = float(self.upsample)
+         width, height = int(upsample*self.width), int(upsample*self.height)
+         real_c, imag_c = self.real_c, self.imag_c
+         if real_c is not None and imag_c is not None:
+             real_c, imag_c = float(real_c), float(imag_c)
+         if self.iters is None:
+             stats = {}
+             with stage(profile,'budget'):
+                 self.iters = adaptive_iterations(self.min_x,self.max_x,self.min_y,
+                                                  self.max_y,width,height,real_c,
+                                                  imag_c,self.backend,stats=stats)
+             self.budget.emit((generation,stats))
+         profile.info['iters'] = self.iters
+         if cancelled():
+             return None
+         with stage(profile,'kernel') as step:
+             if self.progressive:
+                 M = self.refine(generation,cancelled,width,height,real_c,imag_c)
+             else:
+                 M = self.render(generation,cancelled,width,height,real_c,imag_c)
+             step.output(M)
+         if cancelled():
+             return None
+         self.field.emit((generation,self.key,M,self.iters))
+         return color_field(M,upsample,self.fancy,self.cmap,
+                            (self.height,self.width),profile=profile)
+
+    def render(self,generation,cancelled,width,height,real_c,imag_c):
+         upsample = float(self.upsample)
+         M = np.zeros((height,width), dtype=np.float32)
+         for tile, M_tile in render_tiles(self.min_x,self.max_x,self.min_y,
+                                          self.max_y,width,height,self.iters,
+                                          real_c,imag_c,self.tile_backend(),
+                                          cache=get_default_cache(),
+                                          cancelled=cancelled):
+             x, y, w, h = tile
+             M[y:y+h,x:x+w] = M_tile
+             x0, y0, w0, h0 = display_rect(tile,upsample)
+             if w0 > 0 and h0 > 0:
+                 preview = color_field(M_tile,upsample,1,self.cmap,(h0,w0),
+                                       vmin=0,vmax=self.iters)
+                 self.tile.emit((generation,x0,y0,preview))
+         return M
+
+    def refine(self,generation,cancelled,width,height,real_c,imag_c):
+         M = None
+         for level, M in progressive_field(self.min_x,self.max_x,self.min_y,
+                                           self.max_y,width,height,self.iters,
+                                           real_c,imag_c,self.tile_backend(),
+                                           cancelled=cancelled,
+                                           cache=get_default_cache()):
+             if level > 1:
+                 preview = color_field(M,float(self.upsample),self.fancy,self.cmap,
+                                       (self.height,self.width))
+                 self.tile.emit((generation,0,0,preview))
+         return M
+         
+    def tile_backend(self):
+        if self.backend in (None,'auto','parallel'):
+            return 'cpu' if 'cpu' in available_backends() else 'numpy'
+        return self.backend
+
+
+class PreviewRender(QtCore.QObject):
+    frame = QtCore.pyqtSignal(object)
+    def __init__(self,parent,preview):
+        super(PreviewRender, self).__init__(parent)
+        self.preview = preview
+
+    def __call__(self,real_c,imag_c,generation,cancelled):
+        if cancelled():
+            return
+        rgba = self.preview.render(real_c,imag_c)
+        # render() has already adapted the settings for the next frame, so
+        # the ones this frame used travel with it.
+        preview = self.preview
+        self.frame.emit((generation,real_c,imag_c,rgba,preview.last_resolution,
+                         preview.last_iters,preview.last_time))
+
+
+def flipped_image_item(height):
+    # Fields keep min_y in row 0; flip the item instead of the buffer so the
+    # contiguous RGBA array is uploaded as is, with the top row at max_y.
+    item = pg.ImageItem(axisOrder='row-major')
+    item.setTransform(QtGui.QTransform(1,0,0,-1,0,height))
+    return item
+
+
+class ExportThread(QtCore.QThread):
+    progress = QtCore.pyqtSignal(object)
+    def __init__(self,parent,path,vals,graphics,width,height,iters):
+        super(ExportThread, self).__init__(parent)
+        self.path = path
+        self.vals = vals
+        self.graphics = graphics
+        self.width = width
+        self.height = height
+        self.iters = iters
+
     def run(self):
-         image_data = create_fractal(self.min_x,self.max_x,self.min_y,
-                                     self.max_y,self.width,self.height,
-                                     self.iters,self.real_c,self.imag_c,
-                                     self.upsample,self.fancy,self.cmap)
-         self.image.emit(image_data)
+        fancy, cmap, upsample, backend = self.graphics
+        min_x, max_x, min_y, max_y = self.vals[:4]
+        real_c, imag_c = None, None
+        if len(self.vals) == 6:
+            real_c, imag_c = float(self.vals[4]), float(self.vals[5])
+        if self.iters is None:
+            self.iters = adaptive_iterations(min_x,max_x,min_y,max_y,self.width,
+                                             self.height,real_c,imag_c,backend)
+        export_fractal(self.path,min_x,max_x,min_y,max_y,self.width,self.height,
+                       self.iters,real_c,imag_c,upsample,fancy,cmap,backend,
+                       progress=lambda done,total: self.progress.emit((done,total)))
          
          
 class ErrorDialog(QtGui.QDialog):
@@ -112,6 +261,31 @@ class ColorMapSelector(QtGui.QWidget):
     def set_default(self,default_cmap):
         self.combo_box.setCurrentIndex(self.cmap_dict[default_cmap])
 
+
+class BackendSelector(QtGui.QWidget):
+    def __init__(self,default_backend='auto'):
+        super(BackendSelector,self).__init__()
+        
+        backends = ['auto'] + available_backends()
+        self.backend_dict = {}
+        for i,backend in enumerate(backends):
+            self.backend_dict[backend] = i
+        self.combo_label = QtGui.QLabel('Compute Backend:')
+        self.combo_box = QtGui.QComboBox()
+        self.combo_box.addItems(backends)
+        self.set_default(default_backend)
+        self.combo_layout = QtGui.QHBoxLayout()
+        self.combo_layout.addWidget(self.combo_label)
+        self.combo_layout.addWidget(self.combo_box)
+        
+        self.setLayout(self.combo_layout)
+        
+    def selected_backend(self):
+        return str(self.combo_box.currentText())
+    
+    def set_default(self,default_backend):
+        self.combo_box.setCurrentIndex(self.backend_dict.get(str(default_backend),0))
+
 class FractalParameters(QtGui.QWidget):
     def __init__(self,frac_type,settings=None):
         super(FractalParameters,self).__init__()
@@ -126,7 +300,8 @@ class FractalParameters(QtGui.QWidget):
                         'c_imag': '0.1889',
                         'fancy_or_fast': 0,
                         'cmap' : 'gnuplot2',
-                        'upsample' : '2'
+                        'upsample' : '2',
+                        'backend' : 'auto'
                         }
         
         self.frac = frac_type
@@ -174,6 +349,7 @@ class FractalParameters(QtGui.QWidget):
         self.upsample_widget.setLayout(self.upsample_layout)
         
         self.colormaps = ColorMapSelector(settings['cmap'])
+        self.backends = BackendSelector(settings.get('backend','auto'))
         
         
         
@@ -198,6 +374,7 @@ class FractalParameters(QtGui.QWidget):
         self.graphics_grid.addWidget(self.graphics_buttons,0,0)
         self.graphics_grid.addWidget(self.colormaps,0,1)
         self.graphics_grid.addWidget(self.upsample_widget,0,2)
+        self.graphics_grid.addWidget(self.backends,0,3)
         
         self.init_grid.addLayout(self.param_grid,0,0)
         self.init_grid.addLayout(self.graphics_grid,1,0)
@@ -217,7 +394,8 @@ class FractalParameters(QtGui.QWidget):
         fast_or_fancy = self.graphics_buttons.selected_button()
         colormap = self.colormaps.selected_colormap()
         upsampling = self.upsample_edit.text()
-        return (fast_or_fancy,colormap,upsampling)
+        backend = self.backends.selected_backend()
+        return (fast_or_fancy,colormap,upsampling,backend)
     
     def update_defaults(self,settings):
         self.x_min_edit.setText(settings['x_min'])
@@ -230,6 +408,7 @@ class FractalParameters(QtGui.QWidget):
         except:
             pass
         self.graphics_buttons.set_default(settings['fancy_or_fast'])
+        self.backends.set_default(settings.get('backend','auto'))
         
             
 
@@ -240,6 +419,11 @@ class FractalImage(QtGui.QWidget):
         settings = vals_graphics_to_dict(vals,graphics)
         
         self.last_coords = vals
+        self.field = None
+        self.field_key = None
+        self.pan_grid = None
+        self.field_iters = None
+        self.scheduler = RenderScheduler()
         
         self.height = height
         self.width = width
@@ -248,14 +432,20 @@ class FractalImage(QtGui.QWidget):
         self.reset_button = QtGui.QPushButton("Reset")
         self.update_frac_button = QtGui.QPushButton('Update From Parameters')
         self.save_button = QtGui.QPushButton("Export Fractal Image")
+        self.poster_button = QtGui.QPushButton("Export Poster")
+        self.iters_label = QtGui.QLabel('')
+        self.status_bar = QtGui.QStatusBar()
+        self.profile_next = False
         
-        self.draw_frac(vals,graphics,height,width)
+        self.draw_frac(vals,graphics,height,width,delay=0)
         
         self.main_layout = QtGui.QGridLayout()
         self.image_widget = pg.GraphicsView()
-        self.image_data = np.zeros((int(self.height*0.75), int(self.width*0.75),4))
-        self.img = pg.ImageItem(rotate(self.image_data,-90))
+        self.image_data = np.zeros((int(self.height*0.75), int(self.width*0.75),4),
+                                   dtype=np.uint8)
+        self.img = flipped_image_item(self.frac_height)
         self.image_widget.addItem(self.img)
+        self.show_image()
         
         self.roi = pg.ROI((int(self.width*0.1875),int(self.height*0.1875)),
                           (int(self.width*0.375),int(height*0.375)),
@@ -274,10 +464,13 @@ class FractalImage(QtGui.QWidget):
         self.reset_button.clicked.connect(self.reset)
         
         self.fractal_params = FractalParameters(self.frac_type,settings)
+        self.fractal_params.colormaps.combo_box.currentIndexChanged.connect(self.recolor)
+        self.fractal_params.graphics_buttons.radio_button_group.buttonClicked.connect(self.recolor)
         
         self.update_frac_button.clicked.connect(self.update_frac)
         
         self.save_button.clicked.connect(self.file_save)
+        self.poster_button.clicked.connect(self.poster_save)
         
         
         self.params_widget = QtGui.QWidget()
@@ -291,8 +484,42 @@ class FractalImage(QtGui.QWidget):
         self.main_layout.addWidget(self.zoom_button,0,1)
         self.main_layout.addWidget(self.save_button,1,1)
         self.main_layout.addWidget(self.reset_button,0,2)
+        self.main_layout.addWidget(self.poster_button,1,2)
+        self.main_layout.addWidget(self.iters_label,2,0)
+        self.main_layout.addWidget(self.status_bar,3,0,1,3)
+        
+        if self.frac_type == 'Mandelbrot':
+            backend = graphics[3] if graphics[3] != 'auto' else None
+            self.preview_scheduler = RenderScheduler(0)
+            self.preview_render = PreviewRender(None,JuliaPreview(backend=backend))
+            self.preview_render.frame.connect(self.show_preview)
+            self.preview_widget = pg.GraphicsView()
+            self.preview_widget.setFixedSize(PREVIEW_SIZE,PREVIEW_SIZE)
+            self.preview_img = flipped_image_item(PREVIEW_SIZE)
+            self.preview_frame = np.zeros((PREVIEW_SIZE,PREVIEW_SIZE,4), dtype=np.uint8)
+            self.preview_widget.addItem(self.preview_img)
+            self.preview_label = QtGui.QLabel('Hover to preview the Julia set')
+            self.preview_layout = QtGui.QVBoxLayout()
+            self.preview_layout.addWidget(self.preview_widget)
+            self.preview_layout.addWidget(self.preview_label)
+            self.preview_layout.addStretch()
+            self.main_layout.addLayout(self.preview_layout,0,3)
+            self.image_widget.scene().sigMouseMoved.connect(self.hover)
         
         self.setLayout(self.main_layout)
+        self.setFocusPolicy(QtCore.Qt.StrongFocus)
+        
+    def keyPressEvent(self,event):
+        if event.key() == QtCore.Qt.Key_P:
+            self.profile_next = True
+            self.status_bar.showMessage('The next render will be profiled')
+            return
+        moves = {QtCore.Qt.Key_Left: (-1,0), QtCore.Qt.Key_Right: (1,0),
+                 QtCore.Qt.Key_Up: (0,1), QtCore.Qt.Key_Down: (0,-1)}
+        if event.key() not in moves:
+            super(FractalImage,self).keyPressEvent(event)
+            return
+        self.pan(*moves[event.key()])
         
     def test_delete(self):
         print "DID IT WORK"
@@ -303,6 +530,42 @@ class FractalImage(QtGui.QWidget):
         print name[0] + '.png'
         plt.imsave(str(name[0]) + '.png', self.image_data)
         
+    def poster_save(self):
+        graphics = self.fractal_params.graphics_settings()
+        if upsampling_check(graphics[2]) == 1:
+            self.error_dialog = ErrorDialog('Your upsampling rate must be a number.')
+            self.error_dialog.exec_()
+            return
+        elif upsampling_check(graphics[2]) == 2:
+            self.error_dialog = ErrorDialog('Your upsampling rate must be larger than 1.')
+            self.error_dialog.exec_()
+            return
+        width, ok = QtGui.QInputDialog.getInt(self,'Export Poster','Poster width (pixels):',
+                                              4*self.frac_width,1,1000000)
+        if not ok:
+            return
+        name = QtGui.QFileDialog.getSaveFileNameAndFilter(self, 'Save Poster')
+        path = str(name[0])
+        if not path:
+            return
+        if not path.lower().endswith(('.png','.npy')):
+            path += '.png'
+        height = int(round(width*self.frac_height/float(self.frac_width)))
+        self.poster_button.setEnabled(False)
+        self.export_thread = ExportThread(self,path,self.last_coords,graphics,
+                                          width,height,self.field_iters)
+        self.export_thread.progress.connect(self.export_progress)
+        self.export_thread.finished.connect(self.export_done)
+        self.export_thread.start()
+
+    def export_progress(self,progress):
+        done, total = progress
+        self.poster_button.setText('Exporting %d%%' % (100*done//total))
+
+    def export_done(self):
+        self.poster_button.setText("Export Poster")
+        self.poster_button.setEnabled(True)
+
     def update_frac(self):
         vals = self.fractal_params.values()
         if not type_check(vals):
@@ -328,9 +591,10 @@ class FractalImage(QtGui.QWidget):
             return
         
         self.last_coords = vals
+        if view_key(vals,graphics) == self.field_key:
+            self.recolor()
+            return
         self.draw_frac(vals,graphics,self.height,self.width)
-        self.img = pg.ImageItem(rotate(self.image_data,-90))
-        self.image_widget.addItem(self.img)
         
     def reset(self):
         graphics = self.fractal_params.graphics_settings()
@@ -377,21 +641,27 @@ class FractalImage(QtGui.QWidget):
             new_coords = (new_coords[0], new_coords[1], new_coords[2], 
                           new_coords[3], self.last_coords[4], self.last_coords[5])
         
+        if self.field is not None and view_key(self.last_coords,graphics) == self.field_key:
+            seed = crop_field(self.field,(x_min,x_max,y_min,y_max),
+                              self.frac_width,self.frac_height)
+            if seed.size:
+                fancy, cmap, upsample, backend = graphics
+                self.image_data = color_field(seed,float(upsample),fancy,cmap,
+                                              (self.frac_height,self.frac_width))
+                self.show_image()
+        
         settings = vals_graphics_to_dict(new_coords,graphics)
         self.fractal_params.update_defaults(settings)
-        self.draw_frac(new_coords,graphics,self.height,self.width)
+        self.draw_frac(new_coords,graphics,self.height,self.width,progressive=True)
         
     
-    def draw_frac(self,vals,graphics,height,width):
-        self.zoom_button.setEnabled(False)
-        self.reset_button.setEnabled(False)
-        self.update_frac_button.setEnabled(False)
+    def draw_frac(self,vals,graphics,height,width,progressive=False,delay=None):
         self.save_button.setEnabled(False)
         self.last_coords = vals
         frac_scale = 0.75
         self.frac_height = int(height*frac_scale)
         self.frac_width = int(width*frac_scale)
-        fancy, cmap, upsample = graphics
+        fancy, cmap, upsample, backend = graphics
         if len(vals) == 4:
             self.frac_type = 'Mandelbrot'
             min_x, max_x, min_y, max_y = vals
@@ -400,24 +670,128 @@ class FractalImage(QtGui.QWidget):
         if len(vals) == 6:
             self.frac_type = 'Julia'
             min_x, max_x, min_y, max_y, c_real, c_imag = vals
-        self.thread = FracThread(self,min_x,max_x,min_y,max_y,self.frac_width,
-                                 self.frac_height, 512, c_real, c_imag,
-                                 upsample, fancy, cmap)
+        self.frac_render = FracRender(None,min_x,max_x,min_y,max_y,self.frac_width,
+                                      self.frac_height, None, c_real, c_imag,
+                                      upsample, fancy, cmap, backend,
+                                      view_key(vals,graphics), progressive,
+                                      self.profile_hook())
         #self.image_data = create_fractal(min_x, max_x, min_y, max_y,
         #                                    self.frac_width, self.frac_height, 512,
         #                                    c_real, c_imag, upsample, fancy,
         #                                    cmap)
-        self.thread.image.connect(self.swap_image)
-        self.thread.start()
+        self.frac_render.image.connect(self.swap_image)
+        self.frac_render.field.connect(self.store_field)
+        self.frac_render.tile.connect(self.paint_tile)
+        self.frac_render.budget.connect(self.show_budget)
+        self.scheduler.submit(self.frac_render,delay)
+        
+    def profile_hook(self):
+        if not self.profile_next:
+            return None
+        self.profile_next = False
+        return CProfileHook('render-%s.prof' % time.strftime('%Y%m%d-%H%M%S'))
+        
+    def store_field(self,field):
+        generation, key, M, iters = field
+        if not self.scheduler.is_current(generation):
+            return
+        self.field_key, self.field, self.field_iters = key, M, iters
+        height, width = self.field.shape
+        min_x, max_x, min_y, max_y = self.field_key[:4]
+        self.pan_grid = (pixel_grid(min_x,max_x,min_y,max_y,width,height),(0,0),
+                         select_precision(min_x,max_x,min_y,max_y,width,height))
+        
+    def pan(self,step_x,step_y):
+        graphics = self.fractal_params.graphics_settings()
+        if self.field is None or view_key(self.last_coords,graphics) != self.field_key:
+            return
+        grid, offset, precision = self.pan_grid
+        height, width = self.field.shape
+        real_c, imag_c = None, None
+        if len(self.last_coords) == 6:
+            real_c, imag_c = float(self.last_coords[4]), float(self.last_coords[5])
+        fancy, cmap, upsample, backend = graphics
+        self.field, offset = pan_field(self.field,grid,offset,
+                                       step_x*max(width//PAN_STEPS,1),
+                                       step_y*max(height//PAN_STEPS,1),
+                                       self.field_iters,
+                                       real_c,imag_c,backend,precision)
+        coords = view_coords(grid,offset,width,height) + tuple(self.last_coords[4:])
+        self.last_coords = coords
+        self.field_key = view_key(coords,graphics)
+        self.pan_grid = (grid,offset,precision)
+        self.fractal_params.update_defaults(vals_graphics_to_dict(coords,graphics))
+        self.recolor()
+        
+    def recolor(self):
+        if self.field is None:
+            return
+        graphics = self.fractal_params.graphics_settings()
+        if view_key(self.last_coords,graphics) != self.field_key:
+            return
+        fancy, cmap, upsample, backend = graphics
+        self.image_data = color_field(self.field,float(upsample),fancy,cmap,
+                                      (self.frac_height,self.frac_width))
+        self.show_image()
+        
+    def show_budget(self,budget):
+        generation, stats = budget
+        if not self.scheduler.is_current(generation):
+            return
+        self.iters_label.setText('Iterations: %d   Escapes per chunk: %s'
+                                 % (stats['iterations'],
+                                    ' '.join(str(count) for count in stats['escape_histogram'])))
         
-    def swap_image(self,image_data):
+    def paint_tile(self,tile):
+        generation, x, y, rgba = tile
+        if not self.scheduler.is_current(generation):
+            return
+        h, w = rgba.shape[:2]
+        self.image_data[y:y+h,x:x+w] = rgba
+        self.show_image()
+        
+    def hover(self,pos):
+        point = self.img.mapFromScene(pos)
+        x, y = point.x(), point.y()
+        if not (0 <= x < self.frac_width and 0 <= y < self.frac_height):
+            return
+        min_x, max_x, min_y, max_y = [float(coord) for coord in self.last_coords[:4]]
+        real_c = min_x + x*(max_x - min_x)/self.frac_width
+        imag_c = min_y + y*(max_y - min_y)/self.frac_height
+        self.preview_render.preview.cmap = self.fractal_params.graphics_settings()[1]
+        self.preview_scheduler.submit(partial(self.preview_render,real_c,imag_c))
+        
+    def show_preview(self,frame):
+        generation, real_c, imag_c, rgba, resolution, iters, elapsed = frame
+        if not self.preview_scheduler.is_current(generation):
+            return
+        # The render thread reuses its frames, so pyqtgraph gets a copy that
+        # only this thread ever writes.
+        np.copyto(self.preview_frame,rgba)
+        self.preview_img.setImage(self.preview_frame,autoLevels=False,levels=(0,255))
+        self.preview_label.setText('c = %.6f %+.6fi\n%dpx, %d iterations, %.1f ms'
+                                   % (real_c, imag_c, resolution, iters,
+                                      1000*elapsed))
+        
+    def swap_image(self,image):
+        generation, image_data, profile = image
+        if not self.scheduler.is_current(generation):
+            return
         self.image_data = image_data
-        self.img = pg.ImageItem(rotate(self.image_data,-90))
-        self.image_widget.addItem(self.img)
-        self.zoom_button.setEnabled(True)
-        self.reset_button.setEnabled(True)
-        self.update_frac_button.setEnabled(True)
+        with stage(profile,'upload'):
+            self.show_image()
+        profile.info['scheduler'] = self.scheduler.stats()
+        profile.finish()
+        profile.log()
+        message = '%s | queue depth %d' % (profile.summary(),
+                                           profile.info['scheduler']['queue_depth'])
+        if profile.hook is not None:
+            message += ' | cProfile: %s' % profile.hook.path
+        self.status_bar.showMessage(message)
         self.save_button.setEnabled(True)
+        
+    def show_image(self):
+        self.img.setImage(self.image_data,autoLevels=False,levels=(0,255))
 
       
 class FractalWindow(QtGui.QMainWindow):
@@ -429,6 +803,11 @@ class FractalWindow(QtGui.QMainWindow):
         self.screen_height = height
         
         self.setWindowTitle("Fractal Explorer")
+        if WARM_UP:
+            # Compile or load the kernels while the type selection is showing.
+            self.warm_up_thread = threading.Thread(target=warm_up_kernels)
+            self.warm_up_thread.daemon = True
+            self.warm_up_thread.start()
         self.create_select_layout()
         
         self.stacked_layout = QtGui.QStackedLayout()
@@ -540,6 +919,9 @@ def upsampling_check(upsampling):
         return 2
     return 0
 
+def view_key(vals,graphics):
+    return tuple(str(val) for val in vals) + (str(graphics[2]),str(graphics[3]))
+
 def vals_graphics_to_dict(vals,graphics):
     settings = {}
     settings['x_min'] = str(vals[0])
@@ -552,6 +934,7 @@ def vals_graphics_to_dict(vals,graphics):
     settings['fancy_or_fast'] = graphics[0]
     settings['cmap'] = graphics[1]
     settings['upsample'] = graphics[2]
+    settings['backend'] = graphics[3]
     
     return settings
 def main():
@@ -0,0 +1,70 @@
+from __future__ import division
+
+import numpy as np
+
+from backends import get_backend
+from progressive import lattice_field, shift
+
+
+def exposed_strips(width,height,dx,dy):
+    dx = max(-width,min(width,dx))
+    dy = max(-height,min(height,dy))
+    strips = []
+    if dy > 0:
+        strips.append((0,height - dy,width,dy))
+    elif dy < 0:
+        strips.append((0,0,width,-dy))
+    top, bottom = max(-dy,0), height - max(dy,0)
+    if dx > 0:
+        strips.append((width - dx,top,dx,bottom - top))
+    elif dx < 0:
+        strips.append((0,top,-dx,bottom - top))
+    return [strip for strip in strips if strip[2] > 0 and strip[3] > 0]
+
+
+def shift_field(M,dx,dy):
+    height, width = M.shape
+    out = np.zeros_like(M)
+    x0, x1 = max(dx,0), width + min(dx,0)
+    y0, y1 = max(dy,0), height + min(dy,0)
+    if x1 > x0 and y1 > y0:
+        out[y0 - dy:y1 - dy,x0 - dx:x1 - dx] = M[y0:y1,x0:x1]
+    return out
+
+
+def strip_field(grid,x,y,width,height,iters,real_c=None,imag_c=None,
+                backend='cpu',precision='float32',stats=None):
+    min_x, min_y, pixel_size_x, pixel_size_y = grid
+    if precision == 'perturbation':
+        return lattice_field(shift(min_x,pixel_size_x,x),shift(min_y,pixel_size_y,y),
+                             pixel_size_x,pixel_size_y,width,height,iters,
+                             real_c,imag_c,backend,precision,stats)
+    engine = get_backend(backend)
+    if real_c is not None and imag_c is not None:
+        return engine.julia(min_x,min_y,pixel_size_x,pixel_size_y,x,y,width,
+                            height,iters,real_c,imag_c,stats,precision)
+    return engine.mandel(min_x,min_y,pixel_size_x,pixel_size_y,x,y,width,height,
+                         iters,stats,precision)
+
+
+def pan_field(M,grid,offset,dx,dy,iters,real_c=None,imag_c=None,backend='cpu',
+              precision='float32',stats=None):
+    height, width = M.shape
+    x_off, y_off = offset[0] + dx, offset[1] + dy
+    M = shift_field(M,dx,dy)
+    computed = 0
+    for x, y, w, h in exposed_strips(width,height,dx,dy):
+        M[y:y+h,x:x+w] = strip_field(grid,x_off + x,y_off + y,w,h,iters,
+                                     real_c,imag_c,backend,precision,stats)
+        computed += w*h
+    if stats is not None:
+        stats['computed_pixels'] = stats.get('computed_pixels',0) + computed
+    return M, (x_off,y_off)
+
+
+def view_coords(grid,offset,width,height):
+    min_x, min_y, pixel_size_x, pixel_size_y = grid
+    return (shift(min_x,pixel_size_x,offset[0]),
+            shift(min_x,pixel_size_x,offset[0] + width),
+            shift(min_y,pixel_size_y,offset[1]),
+            shift(min_y,pixel_size_y,offset[1] + height))
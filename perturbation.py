@@ -0,0 +1,239 @@
+from __future__ import division
+
+from decimal import Decimal, localcontext
+from math import log, log10
+
+import numpy as np
+
+from backends import DECIMAL_DIGITS, to_decimal
+
+try:
+    import mpmath
+except ImportError:
+    mpmath = None
+
+BAILOUT = 2.0 ** 40
+SA_TOLERANCE = 1e-9
+
+
+def precision_digits(pixel_size):
+    return max(20, int(-log10(abs(pixel_size))) + 15)
+
+
+def reference_orbit(center_real,center_imag,iters,digits,real_c=None,imag_c=None):
+    if mpmath is not None:
+        return _reference_orbit_mpmath(center_real,center_imag,iters,digits,
+                                       real_c,imag_c)
+    return _reference_orbit_decimal(center_real,center_imag,iters,digits,
+                                    real_c,imag_c)
+
+
+def _reference_orbit_mpmath(center_real,center_imag,iters,digits,real_c,imag_c):
+    with mpmath.workdps(digits):
+        center = mpmath.mpc(mpmath.mpf(str(to_decimal(center_real))),
+                            mpmath.mpf(str(to_decimal(center_imag))))
+        if real_c is not None and imag_c is not None:
+            z = center
+            c = mpmath.mpc(mpmath.mpf(str(to_decimal(real_c))),
+                           mpmath.mpf(str(to_decimal(imag_c))))
+        else:
+            z = mpmath.mpc(0)
+            c = center
+        orbit = [complex(z)]
+        for i in range(iters):
+            z = z*z + c
+            zc = complex(z)
+            orbit.append(zc)
+            if zc.real*zc.real + zc.imag*zc.imag >= BAILOUT:
+                break
+    return np.array(orbit, dtype=np.complex128)
+
+
+def _reference_orbit_decimal(center_real,center_imag,iters,digits,real_c,imag_c):
+    with localcontext() as ctx:
+        ctx.prec = digits
+        if real_c is not None and imag_c is not None:
+            zr, zi = to_decimal(center_real), to_decimal(center_imag)
+            cr, ci = to_decimal(real_c), to_decimal(imag_c)
+        else:
+            zr, zi = Decimal(0), Decimal(0)
+            cr, ci = to_decimal(center_real), to_decimal(center_imag)
+        orbit = [complex(float(zr),float(zi))]
+        for i in range(iters):
+            zr, zi = zr*zr - zi*zi + cr, 2*zr*zi + ci
+            zc = complex(float(zr),float(zi))
+            orbit.append(zc)
+            if zc.real*zc.real + zc.imag*zc.imag >= BAILOUT:
+                break
+    return np.array(orbit, dtype=np.complex128)
+
+
+def series_coefficients(orbit,radius,julia=False,tolerance=SA_TOLERANCE):
+    a = 1.0 + 0.0j if julia else 0.0j
+    b = 0.0j
+    c = 0.0j
+    skip = 0
+    for n in range(len(orbit) - 2):
+        z = orbit[n]
+        a_next = 2*z*a + (0.0 if julia else 1.0)
+        b_next = 2*z*b + a*a
+        c_next = 2*z*c + 2*a*b
+        # Same test as |c|r^3 > tol*|a|r, ordered so that nothing underflows
+        # at deep zooms where r^3 alone is below the smallest double.
+        if abs(c_next)*radius*radius > tolerance*abs(a_next):
+            break
+        a, b, c = a_next, b_next, c_next
+        skip = n + 1
+    return skip, a, b, c
+
+
+def multiply(ar,ai,br,bi):
+    return ar*br - ai*bi, ar*bi + ai*br
+
+
+def perturb_numpy(orbit,skip,a,b,c,offset_x,offset_y,pixel_size_x,
+                  pixel_size_y,width,height,iters,julia):
+    # The numba kernel's loop over an active set of the pixels still
+    # bounded, for hosts without numba. Complex products are spelled out on
+    # real parts: NumPy's vectorised complex multiply rounds differently
+    # from the kernel, and deep orbits amplify the last bit.
+    h = 2.0 ** 40
+    log_h = log(log(h))/log(2.0)
+    last = orbit.shape[0] - 1
+    orbit_r, orbit_i = orbit.real.copy(), orbit.imag.copy()
+    cr = np.tile(offset_x + np.arange(width)*pixel_size_x,height)
+    ci = np.repeat(offset_y + np.arange(height)*pixel_size_y,width)
+    ar, ai = multiply(a.real,a.imag,cr,ci)
+    br, bi = multiply(*(multiply(b.real,b.imag,cr,ci) + (cr,ci)))
+    tr, ti = multiply(*(multiply(*(multiply(c.real,c.imag,cr,ci) + (cr,ci))) + (cr,ci)))
+    dr, di = ar + br + tr, ai + bi + ti
+    if julia:
+        cr, ci = np.zeros(cr.size), np.zeros(ci.size)
+    out = np.zeros(width*height, dtype=np.float32)
+    m = np.full(dr.size,skip, dtype=np.int64)
+    index = np.arange(dr.size)
+    rebases = 0
+    with np.errstate(over='ignore', invalid='ignore'):
+        for n in range(skip + 1, iters + 1):
+            if not index.size:
+                break
+            tr, ti = multiply(2*orbit_r[m],2*orbit_i[m],dr,di)
+            sr, si = multiply(dr,di,dr,di)
+            dr, di = tr + sr + cr, ti + si + ci
+            m += 1
+            zr, zi = orbit_r[m] + dr, orbit_i[m] + di
+            az = zr*zr + zi*zi
+            escaped = az >= h
+            out[index[escaped]] = n - 1 - np.log(np.log(az[escaped]))/log(2.0) + log_h
+            wr, wi = zr - orbit_r[0], zi - orbit_i[0]
+            rebase = ((m == last) | (wr*wr + wi*wi < dr*dr + di*di)) & ~escaped
+            rebases += np.count_nonzero(rebase)
+            dr, di = np.where(rebase,wr,dr), np.where(rebase,wi,di)
+            m = np.where(rebase,0,m)
+            keep = ~escaped
+            dr, di, cr, ci, m, index = (dr[keep], di[keep], cr[keep], ci[keep],
+                                        m[keep], index[keep])
+    return out.reshape((height,width)), rebases
+
+
+_kernel = None
+
+def _build_kernel():
+    from numba import njit, prange
+
+    @njit(parallel=True, nogil=True)
+    def perturb_grid(orbit,skip,a,b,c,offset_x,offset_y,pixel_size_x,
+                     pixel_size_y,width,height,iters,julia):
+        out = np.empty((height,width), dtype=np.float32)
+        rebases = np.zeros(height, dtype=np.int64)
+        h = 2.0 ** 40
+        log_h = log(log(h))/log(2.0)
+        last = orbit.shape[0] - 1
+        for y in prange(height):
+            for x in range(width):
+                dc = complex(offset_x + x*pixel_size_x, offset_y + y*pixel_size_y)
+                d = a*dc + b*dc*dc + c*dc*dc*dc
+                if julia:
+                    dc = 0.0j
+                m = skip
+                value = 0.0
+                for n in range(skip + 1, iters + 1):
+                    d = 2*orbit[m]*d + d*d + dc
+                    m += 1
+                    z = orbit[m] + d
+                    az = z.real*z.real + z.imag*z.imag
+                    if az >= h:
+                        value = float(n - 1) - log(log(az))/log(2.0) + log_h
+                        break
+                    w = z - orbit[0]
+                    if m == last or (w.real*w.real + w.imag*w.imag <
+                                     d.real*d.real + d.imag*d.imag):
+                        d = w
+                        m = 0
+                        rebases[y] += 1
+                out[y,x] = value
+        return out, rebases.sum()
+
+    return perturb_grid
+
+
+def get_kernel(backend=None):
+    global _kernel
+    if backend == 'numpy':
+        return perturb_numpy
+    if _kernel is None:
+        try:
+            _kernel = _build_kernel()
+        except ImportError:
+            return perturb_numpy
+    return _kernel
+
+
+class PerturbationReference(object):
+    # One reference orbit and series for a whole view; field() renders any
+    # run of rows from it, so a banded export pays for the orbit once.
+    def __init__(self,min_x,max_x,min_y,max_y,width,height,iters,
+                 real_c=None,imag_c=None,backend=None):
+        self.julia = real_c is not None and imag_c is not None
+        self.backend = backend
+        self.width, self.iters = int(width), int(iters)
+        with localcontext() as ctx:
+            ctx.prec = DECIMAL_DIGITS
+            pixel_size = abs(float(to_decimal(max_x) - to_decimal(min_x))) / width
+        digits = precision_digits(pixel_size)
+        with localcontext() as ctx:
+            ctx.prec = digits
+            min_x, max_x = to_decimal(min_x), to_decimal(max_x)
+            min_y, max_y = to_decimal(min_y), to_decimal(max_y)
+            center_real = (min_x + max_x)/2
+            center_imag = (min_y + max_y)/2
+            self.pixel_size_x = float((max_x - min_x)/width)
+            self.pixel_size_y = float((max_y - min_y)/height)
+            self.offset_x = float(min_x - center_real)
+            self.offset_y = float(min_y - center_imag)
+
+        self.orbit = reference_orbit(center_real,center_imag,iters,digits,
+                                     real_c,imag_c)
+        radius = abs(complex(self.offset_x,self.offset_y))
+        self.skip, self.a, self.b, self.c = series_coefficients(self.orbit,radius,
+                                                                self.julia)
+
+    def field(self,y_off,rows,stats=None):
+        M, rebases = get_kernel(self.backend)(self.orbit,self.skip,self.a,self.b,self.c,
+                                  self.offset_x,
+                                  self.offset_y + y_off*self.pixel_size_y,
+                                  self.pixel_size_x,self.pixel_size_y,self.width,
+                                  int(rows),self.iters,self.julia)
+        if stats is not None:
+            stats['reference_length'] = len(self.orbit)
+            stats['series_skipped_iterations'] = (stats.get('series_skipped_iterations',0)
+                                                  + self.skip*self.width*int(rows))
+            stats['rebases'] = stats.get('rebases',0) + int(rebases)
+        return M
+
+
+def perturbation_field(min_x,max_x,min_y,max_y,width,height,iters,
+                       real_c=None,imag_c=None,stats=None,backend=None):
+    reference = PerturbationReference(min_x,max_x,min_y,max_y,width,height,iters,
+                                      real_c,imag_c,backend)
+    return reference.field(0,height,stats)
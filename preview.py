@@ -0,0 +1,91 @@
+from __future__ import division
+
+import time
+
+import numpy as np
+
+from backends import get_backend, pixel_grid
+from coloring import LUT_SIZE, colormap_lut
+
+FRAME_BUDGET = 0.016
+PREVIEW_SIZE = 256
+MIN_SIZE = 32
+PREVIEW_ITERS = 256
+MIN_ITERS = 32
+JULIA_BOUNDS = (-1.8,1.8,-1.8,1.8)
+
+
+class JuliaPreview(object):
+    def __init__(self,size=PREVIEW_SIZE,iters=PREVIEW_ITERS,budget=FRAME_BUDGET,
+                 bounds=JULIA_BOUNDS,backend=None,cmap='gnuplot2'):
+        self.size = size
+        self.max_iters = iters
+        self.budget = budget
+        self.bounds = bounds
+        self.backend = backend
+        self.cmap = cmap
+        self.resolution = max(MIN_SIZE,size//2)
+        self.iters = max(MIN_ITERS,iters//2)
+        self.frames = 0
+        self.last_time = None
+        self.last_resolution, self.last_iters = None, None
+        # Two preallocated frames: the display copies one while the next
+        # render writes the other. The per-resolution buffers are views into
+        # storage sized for the full resolution, so adapt() never allocates.
+        self._buffers = [np.zeros((size,size,4), dtype=np.uint8) for i in range(2)]
+        self._field = np.empty(size*size, dtype=np.float32)
+        self._scaled = np.empty(size*size, dtype=np.float32)
+        self._indices = np.empty(size*size, dtype=np.intp)
+        self._rgba = np.empty(size*size*4, dtype=np.uint8)
+        self._rows = np.empty(size*size*4, dtype=np.uint8)
+        self._index = {}
+
+    def view(self,buffer,*shape):
+        return buffer[:int(np.prod(shape))].reshape(shape)
+
+    def colorize(self,M,iters,out):
+        # apply_colormap with vmin 0 and vmax iters, through preallocated
+        # scratch instead of temporaries.
+        resolution = M.shape[0]
+        scaled = self.view(self._scaled,resolution,resolution)
+        indices = self.view(self._indices,resolution,resolution)
+        np.multiply(M,np.float32(1.0/iters),out=scaled)
+        scaled *= LUT_SIZE
+        np.copyto(indices,scaled,casting='unsafe')
+        np.clip(indices,0,LUT_SIZE - 1,out=indices)
+        return colormap_lut(self.cmap,LUT_SIZE).take(indices,axis=0,out=out)
+
+    def render(self,real_c,imag_c):
+        start = time.time()
+        min_x, max_x, min_y, max_y = self.bounds
+        resolution, iters = self.resolution, self.iters
+        grid_min_x, grid_min_y, pixel_size_x, pixel_size_y = pixel_grid(
+            min_x,max_x,min_y,max_y,resolution,resolution)
+        M = get_backend(self.backend).julia(grid_min_x,grid_min_y,pixel_size_x,
+                                            pixel_size_y,0,0,resolution,
+                                            resolution,iters,real_c,imag_c,
+                                            out=self.view(self._field,resolution,
+                                                          resolution))
+        rgba = self.colorize(M,iters,self.view(self._rgba,resolution,resolution,
+                                               4))
+        if resolution not in self._index:
+            self._index[resolution] = np.arange(self.size)*resolution//self.size
+        index = self._index[resolution]
+        rows = self.view(self._rows,self.size,resolution,4)
+        out = self._buffers[self.frames % 2]
+        rgba.take(index,axis=0,out=rows)
+        rows.take(index,axis=1,out=out)
+        self.last_time = time.time() - start
+        self.last_resolution, self.last_iters = resolution, iters
+        if self.frames:
+            self.adapt(self.last_time)
+        self.frames += 1
+        return out
+
+    def adapt(self,elapsed):
+        if elapsed > self.budget:
+            self.resolution = max(MIN_SIZE,int(self.resolution*0.75))
+            self.iters = max(MIN_ITERS,int(self.iters*0.75))
+        elif elapsed < 0.5*self.budget:
+            self.resolution = min(self.size,int(self.resolution*1.25) + 1)
+            self.iters = min(self.max_iters,int(self.iters*1.25) + 1)
@@ -0,0 +1,100 @@
+from __future__ import division
+
+import json
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('fractal.render')
+logger.addHandler(logging.NullHandler())
+
+
+class RenderProfile(object):
+    def __init__(self,hook=None,**info):
+        self.info = info
+        self.hook = hook
+        self.times = OrderedDict()
+        self.output_bytes = OrderedDict()
+        self.started = time.time()
+        self.finished = None
+
+    def start_hook(self):
+        if self.hook is not None:
+            self.hook.enable()
+
+    def stop_hook(self):
+        # Profilers such as cProfile are per thread, so this has to run on
+        # the thread that called start_hook.
+        if self.hook is not None:
+            self.hook.disable()
+
+    def add(self,name,seconds=0.0,nbytes=0):
+        self.times[name] = self.times.get(name,0.0) + seconds
+        self.output_bytes[name] = self.output_bytes.get(name,0) + int(nbytes)
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.time()
+        return self.as_dict()
+
+    def as_dict(self):
+        end = self.finished if self.finished is not None else time.time()
+        record = OrderedDict(self.info)
+        record['total_ms'] = round(1000*(end - self.started),3)
+        record['stages_ms'] = OrderedDict((name, round(1000*seconds,3))
+                                          for name, seconds in self.times.items())
+        record['output_bytes'] = OrderedDict(self.output_bytes)
+        return record
+
+    def summary(self):
+        parts = ['%s %.1f ms' % (name, 1000*seconds)
+                 for name, seconds in self.times.items()]
+        parts.append('total %.1f ms' % self.as_dict()['total_ms'])
+        output = sum(self.output_bytes.values())
+        if output:
+            parts.append('%.1f MB output' % (output/2**20))
+        return ' | '.join(parts)
+
+    def log(self):
+        logger.info(json.dumps(self.as_dict()))
+
+
+class Stage(object):
+    def __init__(self,profile,name):
+        self.profile = profile
+        self.name = name
+        self.nbytes = 0
+
+    def output(self,*arrays):
+        # Only the size of what the stage hands on: temporaries inside the
+        # stage are not seen, so this is not a measure of its allocations.
+        for array in arrays:
+            self.nbytes += getattr(array,'nbytes',0)
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self,*exc):
+        if self.profile is not None:
+            self.profile.add(self.name,time.time() - self.start,self.nbytes)
+        return False
+
+
+def stage(profile,name):
+    return Stage(profile,name)
+
+
+class CProfileHook(object):
+    def __init__(self,path):
+        self.path = path
+        self.profiler = None
+
+    def enable(self):
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def disable(self):
+        self.profiler.disable()
+        self.profiler.dump_stats(self.path)
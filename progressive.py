@@ -0,0 +1,123 @@
+from __future__ import division
+
+from decimal import Decimal, localcontext
+
+import numpy as np
+
+from backends import (DECIMAL_DIGITS, get_backend, pixel_grid, select_precision,
+                      to_decimal)
+from perturbation import perturbation_field
+from tiles import cached_field, field_keys, get_pool, store_field
+
+LEVELS = (8,4,2,1)
+SAMPLE_ROWS = 16
+
+
+def shift(origin,pixel_size,steps):
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        # The exact binary pixel size keeps a shifted origin on the same
+        # lattice, so kernels see the same coordinate for the same pixel.
+        return to_decimal(origin) + steps*Decimal(float(pixel_size))
+
+
+def lattice_field(min_x,min_y,pixel_size_x,pixel_size_y,width,height,iters,
+                  real_c=None,imag_c=None,backend='cpu',precision='float32',
+                  stats=None):
+    if precision == 'perturbation':
+        return perturbation_field(min_x,shift(min_x,pixel_size_x,width),
+                                  min_y,shift(min_y,pixel_size_y,height),
+                                  width,height,iters,real_c,imag_c,stats,backend)
+    engine = get_backend(backend)
+    if real_c is not None and imag_c is not None:
+        return engine.julia(min_x,min_y,pixel_size_x,pixel_size_y,0,0,width,
+                            height,iters,real_c,imag_c,stats,precision)
+    return engine.mandel(min_x,min_y,pixel_size_x,pixel_size_y,0,0,width,
+                         height,iters,stats,precision)
+
+
+def lattice_samples(grid,x0,y0,stride,columns,rows,iters,real_c=None,
+                    imag_c=None,backend='cpu',precision='float32',workers=None):
+    # Pixels (x0 + i*stride, y0 + j*stride) from the same per-pixel
+    # coordinates as a full render, SAMPLE_ROWS lattice rows per pool job.
+    min_x, min_y, pixel_size_x, pixel_size_y = grid
+    engine = get_backend(backend)
+    xs = x0 + stride*np.arange(columns)
+    def band(start):
+        ys = y0 + stride*np.arange(start,min(start + SAMPLE_ROWS,rows))
+        return engine.samples(min_x,min_y,pixel_size_x,pixel_size_y,
+                              np.tile(xs,len(ys)),np.repeat(ys,columns),iters,
+                              real_c,imag_c,precision)
+    bands = get_pool('thread',workers).map(band,range(0,rows,SAMPLE_ROWS))
+    return np.concatenate(bands).reshape((rows,columns))
+
+
+def new_offsets(level,previous):
+    if previous is None:
+        return [(0,0)]
+    ratio = previous//level
+    return [(i*level,j*level) for j in range(ratio) for i in range(ratio)
+            if i or j]
+
+
+def progressive_field(min_x,max_x,min_y,max_y,width,height,iters,
+                      real_c=None,imag_c=None,backend='cpu',levels=LEVELS,
+                      precision='auto',stats=None,cancelled=None,cache=None,
+                      workers=None):
+    if precision == 'auto':
+        precision = select_precision(min_x,max_x,min_y,max_y,width,height)
+    if stats is not None:
+        stats['precision'] = precision
+    grid = pixel_grid(min_x,max_x,min_y,max_y,width,height)
+    grid_min_x, grid_min_y, pixel_size_x, pixel_size_y = grid
+    keys = None
+    if cache is not None:
+        keys = field_keys(grid,width,height,iters,real_c,imag_c,precision,backend)
+        M = cached_field(cache,keys,width,height)
+        if M is not None:
+            yield 1, M
+            return
+    samples = np.zeros((height,width), dtype=np.float32)
+    previous = None
+    computed = 0
+    for level in levels:
+        stride = level if previous is None else previous
+        for x0, y0 in new_offsets(level,previous):
+            if cancelled is not None and cancelled():
+                return
+            columns = len(range(x0,width,stride))
+            rows = len(range(y0,height,stride))
+            if not columns or not rows:
+                continue
+            if precision == 'perturbation':
+                samples[y0::stride,x0::stride] = lattice_field(
+                    shift(grid_min_x,pixel_size_x,x0),shift(grid_min_y,pixel_size_y,y0),
+                    stride*pixel_size_x,stride*pixel_size_y,columns,rows,iters,
+                    real_c,imag_c,backend,precision,stats)
+            else:
+                samples[y0::stride,x0::stride] = lattice_samples(
+                    grid,x0,y0,stride,columns,rows,iters,real_c,imag_c,backend,
+                    precision,workers)
+            computed += columns*rows
+        previous = level
+        if stats is not None:
+            stats['computed_pixels'] = computed
+        if level == 1:
+            if keys is not None:
+                store_field(cache,keys,samples)
+            yield level, samples
+        else:
+            coarse = samples[::level,::level]
+            yield level, np.repeat(np.repeat(coarse,level,0),level,1)[:height,:width]
+
+
+def crop_field(M,roi_coords,width,height):
+    x_min, x_max, y_min, y_max = roi_coords
+    scale_x = M.shape[1]/width
+    scale_y = M.shape[0]/height
+    # Display rows run from max_y down while field rows run from min_y up.
+    top = int(round((height - y_max)*scale_y))
+    bottom = int(round((height - y_min)*scale_y))
+    left = int(round(x_min*scale_x))
+    right = int(round(x_max*scale_x))
+    return M[max(top,0):bottom,max(left,0):right]
@@ -0,0 +1,92 @@
+from __future__ import division
+
+import threading
+import time
+import traceback
+
+DEBOUNCE = 0.15
+
+
+class RenderScheduler(object):
+    def __init__(self,delay=DEBOUNCE):
+        self.delay = delay
+        self.generation = 0
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self._pending = None
+        self._running = None
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def submit(self,job,delay=None):
+        if delay is None:
+            delay = self.delay
+        with self._condition:
+            self.generation += 1
+            self.submitted += 1
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (self.generation,job,time.time() + delay)
+            self._condition.notify()
+            return self.generation
+
+    def cancel(self):
+        with self._condition:
+            self.generation += 1
+            if self._pending is not None:
+                self.dropped += 1
+                self._pending = None
+
+    def is_current(self,generation):
+        return generation == self.generation
+
+    def queue_depth(self):
+        with self._condition:
+            return int(self._pending is not None) + int(self._running is not None)
+
+    def stats(self):
+        with self._condition:
+            return {'generation': self.generation,
+                    'submitted': self.submitted,
+                    'started': self.started,
+                    'completed': self.completed,
+                    'cancelled': self.cancelled,
+                    'dropped': self.dropped,
+                    'queue_depth': self.queue_depth()}
+
+    def _next(self):
+        with self._condition:
+            while True:
+                if self._pending is None:
+                    self._condition.wait()
+                    continue
+                generation, job, due = self._pending
+                wait = due - time.time()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                self._pending = None
+                self._running = generation
+                self.started += 1
+                return generation, job
+
+    def _run(self):
+        while True:
+            generation, job = self._next()
+            cancelled = lambda generation=generation: generation != self.generation
+            try:
+                job(generation,cancelled)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._running = None
+                    if cancelled():
+                        self.cancelled += 1
+                    else:
+                        self.completed += 1
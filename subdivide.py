@@ -0,0 +1,55 @@
+from __future__ import division
+
+import numpy as np
+
+from backends import get_backend, pixel_grid
+
+# Mariani-Silver rendering: only rectangle borders go to the kernel. A
+# rectangle whose border has a single integer escape count is filled, any
+# other rectangle is split into quadrants. Filling integer counts (np.ceil
+# of the smooth value, see escape_counts) rests on the iterate after n steps
+# being a polynomial in c (or z0): by the maximum modulus principle an orbit
+# that stays bounded for n steps all along a border stays bounded inside it
+# too. In exact arithmetic a count-0 border therefore cannot enclose an
+# escaping point, and a count-i border cannot enclose an earlier escape.
+# That only holds for border values that really ran the iteration budget.
+# The cardioid/bulb test and periodicity detection return 0 early, and
+# those shortcut zeros were what let escaping pixels get filled, so the
+# kernel marks them unsettled and a border with any unsettled pixel is
+# split rather than filled. Leaves at MIN_SIZE are computed pixel by pixel
+# with the same shortcuts as the brute-force path.
+#
+# Smooth values inside an escape band with count i lie in (i - 1, i], so the
+# interior is filled with a convex blend of the border values and the error
+# of the smooth log(log(az)) colouring is strictly below one iteration.
+# Rectangles on the set itself (count 0) are filled exactly.
+#
+# The recursion runs inside the kernel (backends.subdivide_step) on
+# independent BLOCK_SIZE blocks, so the parallel backend splits the blocks
+# over its threads and no per-rectangle Python call is left. The numpy and
+# cuda backends have no subdivision kernel: subdivide_field renders every
+# pixel there, and computed_pixels reports the full frame.
+
+BLOCK_SIZE = 64
+MIN_SIZE = 8
+
+
+def escape_counts(M):
+    return np.ceil(M)
+
+
+def subdivide_field(min_x,max_x,min_y,max_y,width,height,iters,
+                    real_c=None,imag_c=None,backend='cpu',smooth=True,
+                    min_size=MIN_SIZE,stats=None,precision='float32',
+                    block=BLOCK_SIZE):
+    min_x, min_y, pixel_size_x, pixel_size_y = pixel_grid(min_x,max_x,min_y,max_y,
+                                                          width,height)
+    M, computed = get_backend(backend).subdivide(min_x,min_y,pixel_size_x,
+                                                 pixel_size_y,width,height,iters,
+                                                 real_c,imag_c,block,min_size,
+                                                 stats,precision)
+    if stats is not None:
+        stats['computed_pixels'] = stats.get('computed_pixels',0) + computed
+    if not smooth:
+        M = escape_counts(M)
+    return M
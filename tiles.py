@@ -0,0 +1,179 @@
+from __future__ import division
+
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from backends import get_backend, pixel_grid, record_skipped, select_precision
+from perturbation import perturbation_field
+from cache import tile_key
+
+
+def split_tiles(width,height,tile_size=64):
+    tiles = []
+    for y in range(0,height,tile_size):
+        for x in range(0,width,tile_size):
+            tiles.append((x,y,min(tile_size,width - x),min(tile_size,height - y)))
+    return tiles
+
+
+def order_tiles(tiles,width,height,order='center'):
+    if order == 'raster':
+        return list(tiles)
+    if order == 'center':
+        center_x, center_y = width/2.0, height/2.0
+        def priority(tile):
+            x, y, w, h = tile
+            return (x + w/2.0 - center_x)**2 + (y + h/2.0 - center_y)**2
+        return sorted(tiles,key=priority)
+    raise ValueError('Unknown tile order %r' % order)
+
+
+def render_tile(job):
+    (tile,min_x,min_y,pixel_size_x,pixel_size_y,iters,
+     real_c,imag_c,backend,precision) = job
+    x, y, w, h = tile
+    engine = get_backend(backend)
+    stats = {}
+    if real_c is not None and imag_c is not None:
+        M = engine.julia(min_x,min_y,pixel_size_x,pixel_size_y,x,y,w,h,iters,
+                         real_c,imag_c,stats,precision)
+    else:
+        M = engine.mandel(min_x,min_y,pixel_size_x,pixel_size_y,x,y,w,h,iters,
+                          stats,precision)
+    return tile, M, stats
+
+
+_pools = {}
+
+def get_pool(kind='thread',workers=None):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    key = (kind,workers)
+    if key not in _pools:
+        if kind == 'thread':
+            _pools[key] = ThreadPool(workers)
+        elif kind == 'process':
+            _pools[key] = multiprocessing.Pool(workers)
+        else:
+            raise ValueError('Unknown pool kind %r' % kind)
+    return _pools[key]
+
+
+def cancellable_imap(pool,func,jobs,window,cancelled):
+    jobs = iter(jobs)
+    pending = deque()
+    while True:
+        while len(pending) < window and not cancelled():
+            try:
+                job = next(jobs)
+            except StopIteration:
+                break
+            pending.append(pool.apply_async(func,(job,)))
+        if not pending or cancelled():
+            return
+        yield pending.popleft().get()
+
+
+def render_tiles(min_x,max_x,min_y,max_y,width,height,iters,
+                 real_c=None,imag_c=None,backend='cpu',tile_size=64,
+                 order='center',pool='thread',workers=None,stats=None,
+                 precision='auto',cache=None,cancelled=None):
+    if precision == 'auto':
+        precision = select_precision(min_x,max_x,min_y,max_y,width,height)
+    if stats is not None:
+        stats['precision'] = precision
+    grid_min_x, grid_min_y, pixel_size_x, pixel_size_y = pixel_grid(
+        min_x,max_x,min_y,max_y,width,height)
+    if precision == 'perturbation':
+        frame = (0,0,width,height)
+        key = tile_key(frame,grid_min_x,grid_min_y,pixel_size_x,pixel_size_y,
+                       iters,real_c,imag_c,precision,'perturbation')
+        M = cache.get(key) if cache is not None else None
+        if M is None:
+            M = perturbation_field(min_x,max_x,min_y,max_y,width,height,iters,
+                                   real_c,imag_c,stats,backend)
+            if cache is not None:
+                cache.put(key,M)
+        yield frame, M
+        return
+    tiles = order_tiles(split_tiles(width,height,tile_size),width,height,order)
+    jobs = []
+    keys = {}
+    for tile in tiles:
+        if cancelled is not None and cancelled():
+            return
+        if cache is not None:
+            keys[tile] = tile_key(tile,grid_min_x,grid_min_y,pixel_size_x,
+                                  pixel_size_y,iters,real_c,imag_c,precision,
+                                  backend)
+            M = cache.get(keys[tile])
+            if M is not None:
+                yield tile, M
+                continue
+        jobs.append((tile,grid_min_x,grid_min_y,pixel_size_x,pixel_size_y,iters,
+                     real_c,imag_c,backend,precision))
+    if not jobs:
+        return
+    if cancelled is None:
+        results = get_pool(pool,workers).imap_unordered(render_tile,jobs)
+    else:
+        window = 2*(workers or multiprocessing.cpu_count())
+        results = cancellable_imap(get_pool(pool,workers),render_tile,jobs,
+                                   window,cancelled)
+    for tile, M, tile_stats in results:
+        record_skipped(stats,tile_stats.get('skipped_iterations'))
+        if cache is not None:
+            cache.put(keys[tile],M)
+        yield tile, M
+
+
+def field_keys(grid,width,height,iters,real_c=None,imag_c=None,
+               precision='float32',backend='cpu',tile_size=64):
+    # The cache keys render_tiles uses for a whole view, so other renderers
+    # can share its entries.
+    min_x, min_y, pixel_size_x, pixel_size_y = grid
+    if precision == 'perturbation':
+        tiles, backend = [(0,0,width,height)], 'perturbation'
+    else:
+        tiles = split_tiles(width,height,tile_size)
+    return [(tile,tile_key(tile,min_x,min_y,pixel_size_x,pixel_size_y,iters,
+                           real_c,imag_c,precision,backend)) for tile in tiles]
+
+
+def cached_field(cache,keys,width,height):
+    M = np.zeros((height,width), dtype=np.float32)
+    for (x, y, w, h), key in keys:
+        M_tile = cache.get(key)
+        if M_tile is None:
+            return None
+        M[y:y+h,x:x+w] = M_tile
+    return M
+
+
+def store_field(cache,keys,M):
+    for (x, y, w, h), key in keys:
+        cache.put(key,np.ascontiguousarray(M[y:y+h,x:x+w]))
+
+
+def render_field(min_x,max_x,min_y,max_y,width,height,iters,
+                 real_c=None,imag_c=None,backend='cpu',tile_size=64,
+                 order='center',pool='thread',workers=None,stats=None,
+                 precision='auto',cache=None,cancelled=None):
+    M = np.zeros((height,width), dtype=np.float32)
+    for (x, y, w, h), M_tile in render_tiles(min_x,max_x,min_y,max_y,width,
+                                             height,iters,real_c,imag_c,
+                                             backend,tile_size,order,pool,
+                                             workers,stats,precision,cache,
+                                             cancelled):
+        M[y:y+h,x:x+w] = M_tile
+    return M
+
+
+def display_rect(tile,upsample):
+    x, y, w, h = tile
+    x0, y0 = int(round(x/upsample)), int(round(y/upsample))
+    x1, y1 = int(round((x + w)/upsample)), int(round((y + h)/upsample))
+    return x0, y0, x1 - x0, y1 - y0
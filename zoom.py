@@ -0,0 +1,206 @@
+from __future__ import division, print_function
+
+import argparse
+import os
+import sys
+import threading
+import time
+from decimal import localcontext
+from math import ceil
+
+import numpy as np
+
+from backends import DECIMAL_DIGITS, to_decimal
+
+KEY_ZOOM = 2.0
+FRAME_PATTERN = 'frame_%05d.png'
+
+
+def frame_widths(start_width,end_width,frames):
+    if frames == 1:
+        return [float(start_width)]
+    ratio = float(end_width)/float(start_width)
+    return [float(start_width)*ratio**(k/(frames - 1)) for k in range(frames)]
+
+
+def keyframe_plan(widths,key_zoom=KEY_ZOOM):
+    # Consecutive frames share a keyframe while their widths stay within
+    # key_zoom of each other; the keyframe takes the widest of them.
+    plan = []
+    for index, width in enumerate(widths):
+        if plan:
+            frames = plan[-1]
+            spans = [widths[i] for i in frames] + [width]
+            if max(spans) <= key_zoom*min(spans)*(1 + 1e-9):
+                frames.append(index)
+                continue
+        plan.append([index])
+    return [(max(widths[i] for i in frames),frames) for frames in plan]
+
+
+def view_bounds(center_x,center_y,view_width,width,height):
+    with localcontext() as ctx:
+        ctx.prec = DECIMAL_DIGITS
+        half_x = to_decimal(repr(float(view_width)))/2
+        half_y = half_x*height/width
+        center_x, center_y = to_decimal(center_x), to_decimal(center_y)
+        return center_x - half_x, center_x + half_x, center_y - half_y, center_y + half_y
+
+
+def resample_frame(M,key_width,view_width,width,height):
+    # The keyframe and the frame share a centre, so the sample positions
+    # only depend on the ratio of their pixel sizes.
+    from scipy.ndimage import map_coordinates
+    key_height, key_columns = M.shape
+    scale = (view_width/width)/(key_width/key_columns)
+    xs = key_columns/2 + (np.arange(width) - width/2)*scale
+    ys = key_height/2 + (np.arange(height) - height/2)*scale
+    grid_y, grid_x = np.meshgrid(ys,xs,indexing='ij')
+    return map_coordinates(M,[grid_y,grid_x],order=1,mode='nearest').astype(np.float32)
+
+
+def frame_path(output,index,pattern=FRAME_PATTERN):
+    return os.path.join(output,pattern % index)
+
+
+def render_segment(job):
+    (key_width,frames,widths,center_x,center_y,width,height,iters,real_c,
+     imag_c,fancy,cmap,backend,key_zoom,output,pattern,irange) = job
+    from fractal import color_field, compute_field
+    from export import open_writer
+    key_columns, key_rows = int(ceil(width*key_zoom)), int(ceil(height*key_zoom))
+    min_x, max_x, min_y, max_y = view_bounds(center_x,center_y,key_width,
+                                             key_columns,key_rows)
+    start = time.time()
+    M = compute_field(min_x,max_x,min_y,max_y,key_columns,key_rows,iters,
+                      real_c,imag_c,backend)
+    results = []
+    for index in frames:
+        F = resample_frame(M,key_width,widths[index],width,height)
+        rgba = color_field(F,1,fancy,cmap,None,0,iters,irange)
+        if output is None:
+            results.append((index,rgba))
+            continue
+        # Resume treats any frame on disk as finished, so a frame only gets
+        # its final name once it is complete.
+        path = frame_path(output,index,pattern)
+        root, ext = os.path.splitext(path)
+        temp = '%s.%d.tmp%s' % (root,os.getpid(),ext)
+        writer = open_writer(temp,width,height)
+        writer.write_rows(rgba)
+        writer.close()
+        os.rename(temp,path)
+        results.append((index,None))
+    return results, time.time() - start
+
+
+def worker_pool(workers):
+    import multiprocessing
+    if hasattr(multiprocessing,'get_context'):
+        return multiprocessing.get_context('spawn').Pool(workers)
+    # Python 2 can only fork, and forking after numba or any other thread
+    # has started can deadlock the workers.
+    if 'numba' in sys.modules or threading.active_count() > 1:
+        raise RuntimeError('zoom workers must be started before any kernel or '
+                           'thread runs in this process on Python 2')
+    return multiprocessing.Pool(workers)
+
+
+def zoom_sequence(center_x,center_y,start_width,end_width,frames,width,height,
+                  iters=None,real_c=None,imag_c=None,fancy=True,cmap='gnuplot2',
+                  backend='auto',key_zoom=KEY_ZOOM,output=None,
+                  pattern=FRAME_PATTERN,first=0,workers=None,resume=True):
+    # Yields (frame index, rgba) in order, with rgba None for frames written
+    # to disk; frames already on disk are skipped when resuming.
+    pool = None
+    if workers is not None and workers > 1:
+        pool = worker_pool(workers)
+    try:
+        widths = frame_widths(start_width,end_width,frames)
+        min_x, max_x, min_y, max_y = view_bounds(center_x,center_y,min(widths),
+                                                 width,height)
+        if iters is None:
+            from adaptive import adaptive_iterations
+            iters = adaptive_iterations(min_x,max_x,min_y,max_y,width,height,
+                                        real_c,imag_c,backend)
+        irange = None
+        if fancy == 0:
+            # One lighting range, taken from the deepest frame, for the whole
+            # zoom so the shading does not jump at keyframe boundaries.
+            from export import color_ranges
+            irange = color_ranges(min_x,max_x,min_y,max_y,width,height,iters,
+                                  real_c,imag_c,1,backend)[2]
+        jobs = []
+        for key_width, members in keyframe_plan(widths,key_zoom):
+            members = [index for index in members if index >= first]
+            if output is not None and resume:
+                members = [index for index in members
+                           if not os.path.exists(frame_path(output,index,pattern))]
+            if members:
+                jobs.append((key_width,members,widths,center_x,center_y,width,
+                             height,iters,real_c,imag_c,fancy,cmap,backend,
+                             key_zoom,output,pattern,irange))
+        if pool is not None:
+            results = pool.imap(render_segment,jobs)
+        else:
+            results = (render_segment(job) for job in jobs)
+        for segment, seconds in results:
+            for index, rgba in segment:
+                yield index, rgba
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='zoom',
+                                     description='Render an exponential zoom into a point as a frame sequence.')
+    parser.add_argument('center_x')
+    parser.add_argument('center_y')
+    parser.add_argument('start_width', type=float)
+    parser.add_argument('end_width', type=float)
+    parser.add_argument('frames', type=int)
+    parser.add_argument('-o', '--output', default='.', help='frame directory, or - for raw RGBA on stdout')
+    parser.add_argument('--pattern', default=FRAME_PATTERN)
+    parser.add_argument('-W', '--width', type=int, default=1280)
+    parser.add_argument('-H', '--height', type=int, default=720)
+    parser.add_argument('-i', '--iters', type=int, default=None, help='iterations (default: chosen for the deepest frame)')
+    parser.add_argument('-c', '--julia', nargs=2, type=float, metavar=('REAL','IMAG'))
+    parser.add_argument('--shade', action='store_true')
+    parser.add_argument('--cmap', default='gnuplot2')
+    parser.add_argument('-b', '--backend', default='auto', help='kernel backend (cpu, parallel, cuda, numpy, auto)')
+    parser.add_argument('-k', '--key-zoom', type=float, default=KEY_ZOOM,
+                        help='zoom factor covered by each keyframe')
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('--first', type=int, default=0, help='first frame to render')
+    parser.add_argument('--no-resume', action='store_true', help='re-render frames that already exist')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    real_c, imag_c = args.julia if args.julia else (None,None)
+    pipe = args.output == '-'
+    output = None if pipe else args.output
+    if output is not None and not os.path.isdir(output):
+        os.makedirs(output)
+    stream = getattr(sys.stdout,'buffer',sys.stdout)
+    start = time.time()
+    for index, rgba in zoom_sequence(args.center_x,args.center_y,args.start_width,
+                                     args.end_width,args.frames,args.width,
+                                     args.height,args.iters,real_c,imag_c,
+                                     0 if args.shade else 1,args.cmap,args.backend,
+                                     args.key_zoom,output,args.pattern,args.first,
+                                     args.workers,not args.no_resume):
+        if pipe:
+            stream.write(np.ascontiguousarray(rgba).tobytes())
+            stream.flush()
+        else:
+            print('%s %.2fs' % (frame_path(output,index,args.pattern),
+                                time.time() - start), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())